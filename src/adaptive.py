@@ -0,0 +1,106 @@
+import math
+from collections import OrderedDict
+import numpy as np
+
+ORDERS = {
+    "euler": 1,
+    "cn": 2,
+    "adi": 2,
+    "ftcs": 1,
+}
+MIN_LEVEL = -8
+MAX_LEVEL = 8
+SAFETY = 0.9
+# Built solvers kept per stepper: the current level's dt and dt / 2 and those around them.
+# Each holds on to its factorization, so this is kept small
+SOLVER_HISTORY = 6
+
+
+class AdaptiveStepper:
+    # Step doubling on dt = base_dt * 2^level, so every dt (and dt / 2) used comes from a small
+    # fixed set. The solver and step engine built for each dt are kept and swapped into the
+    # plate, so moving between levels costs neither a factorization nor any setup
+    def __init__(self, plate, base_dt, tolerance):
+        self.plate = plate
+        self.base_dt = base_dt
+        self.tolerance = tolerance
+        self.order = ORDERS[plate.integrator]
+        self.level = 0
+        self.dt = base_dt
+        self.error = 0.0
+        self.accepted = 0
+        self.rejected = 0
+        self.solvers = OrderedDict()
+
+    def use_dt(self, dt):
+        built = self.solvers.get(dt)
+        if built is None:
+            built = self.plate.build_solver(dt)
+            self.solvers[dt] = built
+            if len(self.solvers) > SOLVER_HISTORY:
+                self.solvers.popitem(last=False)
+        else:
+            self.solvers.move_to_end(dt)
+        self.plate.install_solver(built)
+
+    def level_dt(self, level):
+        return self.base_dt * 2.0**level
+
+    def attempt(self, start_map, start_time, dt):
+        plate = self.plate
+        plate.heat_map = start_map.copy()
+        plate.time = start_time
+        self.use_dt(dt)
+        plate.update()
+        coarse = plate.heat_map.copy()
+        plate.heat_map = start_map.copy()
+        plate.time = start_time
+        self.use_dt(dt / 2)
+        plate.update()
+        plate.update()
+        # Richardson estimate of the local error of the two half steps
+        return np.abs(plate.heat_map - coarse).max() / (2**self.order - 1)
+
+    def next_level(self, error):
+        if error == 0:
+            return self.level + 1
+        factor = SAFETY * (self.tolerance / error) ** (1 / (self.order + 1))
+        return self.level + min(1, math.floor(math.log2(factor)))
+
+    def step(self, max_dt=math.inf):
+        plate = self.plate
+        start_map = plate.heat_map.copy()
+        start_time = plate.time
+        while self.level > MIN_LEVEL and self.level_dt(self.level) > max_dt:
+            self.level -= 1
+        while True:
+            dt = self.level_dt(self.level)
+            error = self.attempt(start_map, start_time, dt)
+            if error <= self.tolerance or self.level == MIN_LEVEL:
+                break
+            self.rejected += 1
+            self.level = max(MIN_LEVEL, min(self.level - 1, self.next_level(error)))
+        self.accepted += 1
+        self.dt = dt
+        self.error = error
+        self.level = max(MIN_LEVEL, min(MAX_LEVEL, self.next_level(error)))
+        return dt
+
+    def advance(self, duration, on_step=None):
+        plate = self.plate
+        end_time = plate.time + duration
+        smallest_dt = self.level_dt(MIN_LEVEL)
+        # step never goes past the time left, so up to the smallest level every step is still
+        # on a quantized dt
+        while end_time - plate.time >= smallest_dt:
+            self.step(end_time - plate.time)
+            if on_step is not None:
+                on_step()
+        remainder = end_time - plate.time
+        if remainder > 1e-9 * duration:
+            # Land exactly on the requested time with one step shorter than the smallest level,
+            # whose factorization is not worth a place in the factor cache
+            plate.install_solver(plate.build_solver(remainder, cached=False))
+            plate.update()
+            if on_step is not None:
+                on_step()
@@ -0,0 +1,74 @@
+import numpy as np
+from backwards_euler import gen_boundary_vector, update_boundary_vector, neighbour_sum
+
+
+def gen_banded_matrix(n, r, dtype=float):
+    # (I - r/2 d^2) for one line of n interior points in LAPACK banded storage
+    ab = np.empty((3, n), dtype=dtype)
+    ab[0, :] = -r / 2
+    ab[1, :] = 1 + r
+    ab[2, :] = -r / 2
+    return ab
+
+
+def sweep(ab, temps, r):
+    # Implicit along axis 1 and explicit along axis 0, every line solved in one batched call
+    import scipy.linalg as sla
+
+    inner = temps[1:-1, 1:-1]
+    rhs = inner + r / 2 * (temps[:-2, 1:-1] - 2 * inner + temps[2:, 1:-1])
+    rhs[:, 0] += r / 2 * temps[1:-1, 0]
+    rhs[:, -1] += r / 2 * temps[1:-1, -1]
+    return sla.solve_banded((1, 1), ab, rhs.T, overwrite_b=True, check_finite=False).T
+
+
+def next_temps(ab, prev_temps, r):
+    # Peaceman-Rachford: implicit in x for the first half step, implicit in y for the second
+    half_temps = prev_temps.copy()
+    half_temps[1:-1, 1:-1] = sweep(ab, prev_temps, r)
+    prev_temps[1:-1, 1:-1] = sweep(ab, half_temps.T, r).T
+    return prev_temps
+
+
+class StepEngine:
+    def __init__(self, ab, temps, r):
+        import scipy.linalg as sla
+
+        n = len(temps) - 2
+        self.solve_banded = sla.solve_banded
+        self.ab = ab
+        self.r = r
+        # Each half step sees half of the border contribution
+        self.boundary = gen_boundary_vector(temps, r / 2)
+        self.inner = np.empty((n, n), dtype=temps.dtype)
+        self.known_x = np.empty((n, n), dtype=temps.dtype)
+        self.known_y = np.empty((n, n), dtype=temps.dtype)
+        self.neighbours = np.empty((n, n), dtype=temps.dtype)
+
+    def set_boundary(self, temps, restart=False):
+        update_boundary_vector(self.boundary, temps, self.r / 2)
+
+    def solve(self, known):
+        # Solves every column of known as its own tridiagonal system
+        return self.solve_banded((1, 1), self.ab, known, overwrite_b=True, check_finite=False)
+
+    def explicit(self, u, axis, out):
+        # (1 - r) u + r/2 * (neighbours along axis) + borders, written into out
+        neighbours = self.neighbours
+        neighbours.fill(0)
+        neighbour_sum(u, neighbours, axis)
+        neighbours *= self.r / 2
+        np.multiply(u, 1 - self.r, out=out)
+        out += neighbours
+        out += self.boundary
+        return out
+
+    def __call__(self, temps):
+        inner_points = temps[1:-1, 1:-1]
+        np.copyto(self.inner, inner_points)
+        known = self.explicit(self.inner, 0, self.known_x)
+        # The transposed buffer is Fortran ordered, so LAPACK can solve it in place
+        np.copyto(self.inner, self.solve(known.T).T)
+        known = self.explicit(self.inner, 1, self.known_y)
+        inner_points[...] = self.solve(known)
+        return temps
@@ -1,6 +1,8 @@
+from collections import namedtuple
 import numpy as np
-import scipy.sparse as spr
-import scipy.sparse.linalg as spl
+
+# Border coefficients of a plate whose coefficient varies along its edges, one array per edge
+EdgeCoefficients = namedtuple("EdgeCoefficients", ["bottom", "top", "left", "right"])
 
 
 def insert_matrix(small_matrix, large_matrix, c, r):
@@ -10,33 +12,47 @@ def insert_matrix(small_matrix, large_matrix, c, r):
     return large_matrix
 
 
-def gen_coeff_matrix(n, diag, hor):
-    N = (
-        n**2
-    )  # For an original n by n grid of interior points, the coefficient matrix becomes n^2 by n^2
-    A = np.zeros((N, N))
-    for y in range(0, n):
-        for x in range(0, n):
-            k = x + n * y
-            A[k, k] = diag
-            if x > 0:
-                A[k - 1, k] = hor
-            if x < n - 1:
-                A[k + 1, k] = hor
-            if y > 0:
-                A[k, k - n] = hor
-            if y < n - 1:
-                A[k, k + n] = hor
-    return A
+def gen_coeff_matrix(n, diag, hor, dtype=float):
+    # For an original n by n grid of interior points, the coefficient matrix becomes n^2 by n^2.
+    # It is assembled as I (x) T + T (x) I so that only the 5n^2 nonzeros are ever stored.
+    # scipy.sparse is imported on first use, it takes longer to load than the rest of startup
+    import scipy.sparse as spr
+
+    neighbours = spr.diags([hor, hor], [-1, 1], shape=(n, n), format="csr", dtype=dtype)
+    identity = spr.identity(n, format="csr", dtype=dtype)
+    A = (
+        spr.kron(identity, neighbours, format="csr")
+        + spr.kron(neighbours, identity, format="csr")
+        + spr.identity(n**2, format="csr", dtype=dtype) * diag
+    )
+    return A.tocsc()
+
+
+def gen_boundary_vector(temps, r):
+    # Contribution of the borders to the right hand side, for one map or a stack of them
+    n = temps.shape[-1] - 2
+    boundary = np.zeros(temps.shape[:-2] + (n, n), dtype=temps.dtype)
+    return update_boundary_vector(boundary, temps, r)
+
+
+def update_boundary_vector(boundary, temps, r):
+    # Rewrites the contribution in place after the borders changed. Only its outermost rows and
+    # columns are nonzero, so this is O(n) rather than O(n^2). r is one coefficient or an
+    # EdgeCoefficients
+    bottom, top, left, right = r if isinstance(r, EdgeCoefficients) else (r, r, r, r)
+    boundary[..., 0, :] = 0
+    boundary[..., -1, :] = 0
+    boundary[..., :, 0] = 0
+    boundary[..., :, -1] = 0
+    boundary[..., 0, :] += bottom * temps[..., 0, 1:-1]
+    boundary[..., -1, :] += top * temps[..., -1, 1:-1]
+    boundary[..., :, 0] += left * temps[..., 1:-1, 0]
+    boundary[..., :, -1] += right * temps[..., 1:-1, -1]
+    return boundary
 
 
 def gen_known_vector(prev_temps, r):
-    inner_points = prev_temps[1:-1, 1:-1]
-    inner_points[0, :] += r * prev_temps[0, 1:-1]
-    inner_points[-1, :] += r * prev_temps[-1, 1:-1]
-    inner_points[:, 0] += r * prev_temps[1:-1, 0]
-    inner_points[:, -1] += r * prev_temps[1:-1, -1]
-    return inner_points.flatten()
+    return (prev_temps[1:-1, 1:-1] + gen_boundary_vector(prev_temps, r)).ravel()
 
 
 def next_temps(solve_matrix, prev_temps, r):
@@ -46,3 +62,49 @@ def next_temps(solve_matrix, prev_temps, r):
     new_temps_matrix = new_temps_vec.reshape(n - 2, n - 2)
     prev_temps = insert_matrix(new_temps_matrix, prev_temps, 1, 1)
     return prev_temps
+
+
+def neighbour_sum(u, out, axis):
+    # Adds the neighbours of u along one axis (zero outside) into out. Only flat, contiguous
+    # views are used, since numpy allocates iteration buffers for 2D strided operands
+    n = u.shape[1]
+    flat_u = u.reshape(-1)
+    flat_out = out.reshape(-1)
+    if axis == 0:
+        flat_out[n:] += flat_u[:-n]
+        flat_out[:-n] += flat_u[n:]
+    else:
+        flat_out[1:] += flat_u[:-1]
+        flat_out[:-1] += flat_u[1:]
+        # Undo the terms that wrapped around from the end of the neighbouring row
+        flat_out[n::n] -= flat_u[n - 1 : -1 : n]
+        flat_out[n - 1 : -1 : n] -= flat_u[n::n]
+    return out
+
+
+class StepEngine:
+    # Owns the right hand side buffer and the border contribution for one plate and coefficient,
+    # so a step is one fused add and a solve written straight back into the heat map.
+    # A stack of heat maps is advanced with a single multiple right hand side solve
+    def __init__(self, solve_matrix, temps, r):
+        n = temps.shape[-1] - 2
+        self.solve = solve_matrix
+        self.r = r
+        self.boundary = gen_boundary_vector(temps, r)
+        self.known = np.empty(temps.shape[:-2] + (n, n), dtype=temps.dtype)
+        if temps.ndim == 2:
+            self.known_vec = self.known.reshape(-1)
+        else:
+            # One column per member, Fortran ordered so the solvers can use it without copying
+            self.known_vec = self.known.reshape(-1, n * n).T
+
+    def set_boundary(self, temps, restart=False):
+        # The borders the next step ends at, which is all Backward Euler sees of them
+        update_boundary_vector(self.boundary, temps, self.r)
+
+    def __call__(self, temps):
+        inner_points = temps[..., 1:-1, 1:-1]
+        np.copyto(self.known, inner_points)
+        self.known += self.boundary
+        inner_points[...] = self.solve(self.known_vec).T.reshape(self.known.shape)
+        return temps
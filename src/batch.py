@@ -0,0 +1,315 @@
+import argparse
+import math
+import sys
+import time
+import numpy as np
+from exceptions import InputError, InitializationError
+import utils as ut
+from plate import gen_plate
+from materials import describe
+from ensemble import gen_ensemble
+from adaptive import AdaptiveStepper
+from diagnostics import Diagnostics
+from recording import Recorder
+from boundary import load_boundary
+from steady import steady_state, steps_to_equilibrium, EQUILIBRIUM_TOLERANCE
+from config import DEFAULTS_PATH
+
+
+def build_plate(params, seed=None, boundary=None):
+    plate = gen_plate(
+        params["points"],
+        params["side_length"],
+        params["function"],
+        params["min_temp"],
+        params["max_temp"],
+        params["solver"],
+        params["tolerance"],
+        params["integrator"],
+        seed,
+        params["precision"],
+    )
+    plate.gen_material_properties(params["material"])
+    plate.gen_solver(params["dt"])
+    if boundary is not None:
+        plate.set_boundary(load_boundary(boundary, plate.points))
+    return plate
+
+
+def build_ensemble(params, members, seed=None):
+    ensemble = gen_ensemble(
+        members,
+        params["points"],
+        params["side_length"],
+        params["function"],
+        params["min_temp"],
+        params["max_temp"],
+        params["solver"],
+        seed,
+        params["precision"],
+    )
+    ensemble.integrator = params["integrator"]
+    ensemble.gen_material_properties(params["material"])
+    ensemble.gen_solver(params["dt"])
+    return ensemble
+
+
+def advance(plate, dt, steps=None, duration=None, adaptive=None, observers=()):
+    on_step = None
+    if observers:
+
+        def on_step():
+            for observer in observers:
+                observer.stepped()
+
+    if adaptive:
+        stepper = AdaptiveStepper(plate, dt, adaptive)
+        if duration is None:
+            for _ in range(steps):
+                stepper.step()
+                if on_step is not None:
+                    on_step()
+            return steps
+        stepper.advance(duration, on_step)
+        return stepper.accepted
+    if steps is None:
+        steps = math.ceil(duration / dt - 1e-9)
+    plate.advance(steps, observers)
+    return steps
+
+
+def save(plate, path, params, diagnostics=None):
+    series = {}
+    if diagnostics is not None:
+        series = {f"diagnostics_{field}": diagnostics.series(field) for field in diagnostics.latest()._fields}
+    np.savez_compressed(
+        path,
+        heat_map=plate.heat_map,
+        initial_heat_map=plate.initial_heat_map,
+        time=plate.time,
+        **params,
+        **series,
+    )
+
+
+def run(params, steps=None, duration=None, adaptive=None, output=None, seed=None, diagnostics_every=None, record=None, record_every=1, compress=False, boundary=None):
+    plate = build_plate(params, seed, boundary)
+    observers = []
+    diagnostics = None
+    if diagnostics_every:
+        diagnostics = Diagnostics(plate, params["thickness"], diagnostics_every)
+        observers.append(diagnostics)
+    recorder = None
+    if record is not None:
+        expected = steps if steps is not None else math.ceil(duration / params["dt"])
+        recorder = Recorder(record, plate, params, record_every, expected // record_every + 1, compress)
+        observers.append(recorder)
+    start = time.perf_counter()
+    try:
+        taken = advance(plate, params["dt"], steps, duration, adaptive, observers)
+    finally:
+        wall = time.perf_counter() - start
+        if recorder is not None:
+            recorder.close()
+    if output is not None:
+        save(plate, output, params, diagnostics)
+    return plate, taken, wall, diagnostics, recorder
+
+
+def run_steady(params, epsilon=EQUILIBRIUM_TOLERANCE, output=None, seed=None, boundary=None):
+    # Jumps straight to the equilibrium; the steps it replaces are predicted, not taken.
+    # Scheduled edges are held at their values at the start
+    plate = build_plate(params, seed, boundary)
+    start = time.perf_counter()
+    steady = steady_state(plate.heat_map, plate.layout)
+    steps = steps_to_equilibrium(plate, epsilon, steady)
+    wall = time.perf_counter() - start
+    plate.heat_map = steady
+    plate.time = steps * plate.dt
+    if output is not None:
+        save(plate, output, params)
+    return plate, steps, wall
+
+
+def precision_drift(params, steps=None, duration=None, seed=None, boundary=None):
+    # The same plate advanced in float64 and float32, to see what single precision costs in
+    # accuracy and gains in speed before using it. Returns the drift and both runs' wall times
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    plates = {}
+    walls = {}
+    for precision in ("float64", "float32"):
+        plate = build_plate(dict(params, precision=precision), seed, boundary)
+        start = time.perf_counter()
+        taken = advance(plate, params["dt"], steps, duration)
+        walls[precision] = time.perf_counter() - start
+        plates[precision] = plate
+    reference = plates["float64"].heat_map
+    drift = np.abs(plates["float32"].heat_map - reference)
+    dv = plates["float64"].dr**2 * params["thickness"]
+    energies = {precision: dv * ut.heat_sum(plate.p, plate.c, plate.heat_map) for precision, plate in plates.items()}
+    return {
+        "steps": taken,
+        "time": plates["float64"].time,
+        "max_drift": drift.max(),
+        "mean_drift": drift.mean(),
+        "energy": energies["float64"],
+        "energy_drift": energies["float32"] - energies["float64"],
+        "walls": walls,
+    }
+
+
+def print_drift(drift):
+    energy = ut.convert_energy(abs(drift["energy_drift"]))
+    walls = drift["walls"]
+    speedup = walls["float64"] / walls["float32"] if walls["float32"] > 0 else math.inf
+    print(
+        f"""
+Float32 Drift After {drift["steps"]} Steps ({round(drift["time"], 2)}s simulated)
+Max Temperature Drift: {drift["max_drift"]:.3e}K
+Mean Temperature Drift: {drift["mean_drift"]:.3e}K
+Energy Drift: {energy[0].round(4)}{energy[1]} ({abs(drift["energy_drift"]) / drift["energy"]:.2e} of the total)
+Wall Time: {round(walls["float64"], 3)}s in float64, {round(walls["float32"], 3)}s in float32 ({round(speedup, 2)}x)
+    """
+    )
+
+
+def run_ensemble(params, members, steps=None, duration=None, output=None, seed=None):
+    ensemble = build_ensemble(params, members, seed)
+    start = time.perf_counter()
+    taken = advance(ensemble, params["dt"], steps, duration)
+    wall = time.perf_counter() - start
+    if output is not None:
+        save(ensemble, output, params)
+    return ensemble, taken, wall
+
+
+def print_ensemble_stats(ensemble, thickness):
+    members, aggregate = ensemble.stats(thickness)
+    print(f"{'member':>8} {'mean':>10} {'min':>10} {'max':>10} {'energy':>12}")
+    for i in range(ensemble.members):
+        energy = ut.convert_energy(members["energy"][i])
+        print(
+            f"{i:>8} {members['mean'][i]:>9.2f}K {members['min'][i]:>9.2f}K "
+            f"{members['max'][i]:>9.2f}K {energy[0]:>9.2f}{energy[1]:<3}"
+        )
+    energy = ut.convert_energy(aggregate["energy"])
+    print(
+        f"""
+Ensemble Average Temperature: {aggregate["mean"].round(2)}K (std {aggregate["std"].round(2)}K)
+Ensemble Temperature Range: {aggregate["min"].round(2)}K to {aggregate["max"].round(2)}K
+Ensemble Average Thermal Energy: {energy[0].round(2)}{energy[1]}
+    """
+    )
+
+
+def print_diagnostics(diagnostics):
+    sample = diagnostics.latest()
+    energy = ut.convert_energy(sample.energy)
+    imbalance = ut.convert_energy(abs(sample.imbalance))
+    print(
+        f"""Samples: {len(diagnostics.samples)} (every {diagnostics.every} steps)
+Interior Temperature Range: {sample.min.round(2)}K to {sample.max.round(2)}K
+Interior Thermal Energy: {energy[0].round(2)}{energy[1]}
+Boundary Heat Flow: {round(sample.flux, 2)}W
+Energy Balance Error: {imbalance[0].round(2)}{imbalance[1]} ({diagnostics.relative_imbalance():.2e} of exchanged heat)
+    """
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="simulation.py batch", description="run a plate without rendering")
+    parser.add_argument("-f", "--function", type=str, help="function with which to generate the initial heat distribution")
+    parser.add_argument("-p", "--points", type=int, help="number of points per side with which to approximate the plate")
+    parser.add_argument("-m", "--material", type=str, help="material of the plate, or up to four comma-separated ones for its quadrants")
+    parser.add_argument("-s", "--side", dest="side_length", type=float, help="side length of the plate in meters")
+    parser.add_argument("-t", "--time", dest="dt", type=float, help="time step of the simulation in seconds")
+    parser.add_argument("-th", "--thickness", type=float, help="thickness of the plate in meters")
+    parser.add_argument("-i", "--integrator", type=str, help="time integrator (euler, cn, adi, ftcs or auto)")
+    parser.add_argument("-S", "--solver", type=str, help="linear solver backend (lu, dst or cg)")
+    parser.add_argument("-tol", "--tolerance", type=float, help="relative residual tolerance of the cg solver")
+    parser.add_argument("-a", "--adaptive", type=float, help="adaptive time stepping with the given error per step in kelvin")
+    parser.add_argument("--seed", type=int, help="seed for the initial heat distribution")
+    parser.add_argument("-P", "--precision", type=str, help="floating point precision of the plate (float64 or float32)")
+    parser.add_argument("-b", "--boundary", type=str, help="JSON file scheduling the edge temperatures over time")
+    parser.add_argument("--drift", action="store_true", help="run the plate in both float64 and float32 and report how far apart they end up")
+    parser.add_argument("-dg", "--diagnostics", type=int, help="sample energy, temperatures and boundary heat flow every this many steps (single plates only)")
+    parser.add_argument("-r", "--record", type=str, help="record the run to this file (single plates only)")
+    parser.add_argument("-rk", "--record-every", type=int, default=1, help="record every this many steps")
+    parser.add_argument("-z", "--compress", action="store_true", help="record to a compressed chunked file instead of a memory-mapped one")
+    parser.add_argument("-e", "--ensemble", type=int, help="advance this many random initial maps together with one solve per step")
+    parser.add_argument("-eps", "--epsilon", type=float, default=EQUILIBRIUM_TOLERANCE, help="distance in kelvin from the equilibrium that counts as settled for --steady")
+    parser.add_argument("-o", "--output", type=str, help="write the final state and parameters to this .npz file")
+    horizon = parser.add_mutually_exclusive_group(required=True)
+    horizon.add_argument("-n", "--steps", type=int, help="number of steps to advance")
+    horizon.add_argument("-T", "--duration", type=float, help="simulated seconds to advance")
+    horizon.add_argument("--steady", action="store_true", help="solve for the equilibrium and predict the steps it takes to reach")
+    args = parser.parse_args(argv)
+
+    try:
+        params = ut.get_default_params(DEFAULTS_PATH)
+    except InitializationError as e:
+        print("[FATAL]", e)
+        sys.exit(1)
+    for key, val in vars(args).items():
+        if val is not None and key in params:
+            params[key] = val
+
+    diagnostics = None
+    recorder = None
+    try:
+        if args.drift:
+            if args.steady:
+                parser.error("--drift needs -n or -T")
+            print_drift(precision_drift(params, args.steps, args.duration, args.seed, args.boundary))
+            return
+        if args.steady:
+            plate, taken, wall = run_steady(params, args.epsilon, args.output, args.seed, args.boundary)
+        elif args.ensemble:
+            plate, taken, wall = run_ensemble(params, args.ensemble, args.steps, args.duration, args.output, args.seed)
+        else:
+            plate, taken, wall, diagnostics, recorder = run(
+                params,
+                args.steps,
+                args.duration,
+                args.adaptive,
+                args.output,
+                args.seed,
+                args.diagnostics,
+                args.record,
+                args.record_every,
+                args.compress,
+                args.boundary,
+            )
+    except InputError as e:
+        print("[WARN]", e)
+        sys.exit(2)
+    except InitializationError as e:
+        print("[FATAL]", e)
+        sys.exit(1)
+
+    rate = f"{round(taken / wall, 1) if wall > 0 else 'inf'} steps/s"
+    if args.steady:
+        rate = "one solve"
+    print(
+        f"""
+Material: {describe(params["material"])}
+Points: {plate.points}x{plate.points}
+Precision: {plate.heat_map.dtype}
+Steps: {taken}{f" (predicted to within {args.epsilon}K)" if args.steady else ""}
+Simulated Time: {round(plate.time, 2)}s
+Wall Time: {round(wall, 3)}s ({rate})
+Average Temperature: {plate.heat_map.mean().round(2)}K
+    """
+    )
+    if args.ensemble:
+        print(f"Throughput: {round(args.ensemble * taken / wall, 1) if wall > 0 else 'inf'} member-steps/s")
+        print_ensemble_stats(plate, params["thickness"])
+    elif diagnostics is not None:
+        print_diagnostics(diagnostics)
+    if recorder is not None:
+        print(f"Recorded: {recorder.frames()} frames to {args.record} ({recorder.dropped} dropped)")
+
+
+if __name__ == "__main__":
+    main()
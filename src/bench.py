@@ -0,0 +1,658 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import resource
+import subprocess
+import time
+import tracemalloc
+import numpy as np
+import scipy
+import scipy.fft as fft
+import scipy.sparse.linalg as spl
+import adi
+import backwards_euler
+from backwards_euler import gen_coeff_matrix
+from solvers import SOLVERS, factor_cache, get_solver, laplacian_eigenvalues
+from plate import Plate
+from adaptive import AdaptiveStepper
+from ensemble import EnsemblePlate
+from config import BASELINE_PATH
+import gen.initial_gen as gen
+import utils as ut
+import explicit
+from boundary import BoundarySchedule, EdgeSchedule
+from materials import gen_layout
+
+GENERATORS = ["poly", "piecewise_poly", "piecewise", "border", "constant"]
+# Factorizing above this many points per side takes minutes and gigabytes
+FACTOR_LIMIT = 1000
+REGRESSION_RATIO = 1.25
+# Differences below these are noise, however large the ratio
+REGRESSION_SECONDS = 1e-3
+REGRESSION_BYTES = 2**20
+# Entry points timed by the startup report, and the packages none of them may import before
+# they are needed
+STARTUP_MODULES = ["simulation", "batch", "export", "sweep"]
+DEFERRED_MODULES = ["matplotlib", "scipy"]
+
+
+def peak_rss():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure_setup(points):
+    n = points - 2
+    coeff = 0.2
+    baseline_rss = peak_rss()
+    start = time.perf_counter()
+    coeff_matrix = gen_coeff_matrix(n, 1 + 4 * coeff, -coeff)
+    assembly_time = time.perf_counter() - start
+    assembly_rss = peak_rss()
+    start = time.perf_counter()
+    spl.factorized(coeff_matrix)
+    factor_time = time.perf_counter() - start
+    return {
+        "points": points,
+        "cells": n**2,
+        "assembly_s": assembly_time,
+        "assembly_rss": assembly_rss - baseline_rss,
+        "factor_s": factor_time,
+        "peak_rss": peak_rss(),
+    }
+
+
+def run_isolated(fn, *args):
+    # Each measurement gets a fresh interpreter so peak RSS is not shared between sizes
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(fn, args)
+
+
+def points_scaling(sizes):
+    print(
+        f"{'points':>8} {'cells':>10} {'assembly':>10} {'ns/cell':>8} "
+        f"{'asm MiB':>8} {'B/cell':>8} {'factor':>10} {'peak MiB':>9}"
+    )
+    for points in sizes:
+        r = run_isolated(measure_setup, points)
+        cells = r["cells"]
+        print(
+            f"{points:>8} {cells:>10} {r['assembly_s']:>9.3f}s "
+            f"{r['assembly_s'] / cells * 1e9:>8.1f} "
+            f"{r['assembly_rss'] / 2**20:>8.1f} {r['assembly_rss'] / cells:>8.1f} "
+            f"{r['factor_s']:>9.3f}s {r['peak_rss'] / 2**20:>9.1f}"
+        )
+
+
+def measure_solver(name, points, steps):
+    coeff = 0.2
+    start = time.perf_counter()
+    solve = get_solver(name, points, coeff)
+    setup_time = time.perf_counter() - start
+    rhs = np.random.default_rng(0).uniform(273, 1000, (points - 2) ** 2)
+    start = time.perf_counter()
+    for _ in range(steps):
+        solve(rhs)
+    step_time = (time.perf_counter() - start) / steps
+    return {
+        "solver": name,
+        "points": points,
+        "setup_s": setup_time,
+        "step_s": step_time,
+        "peak_rss": peak_rss(),
+    }
+
+
+def solver_comparison(sizes, names, steps):
+    print(f"{'solver':>8} {'points':>8} {'setup':>10} {'step':>10} {'peak MiB':>9}")
+    for points in sizes:
+        for name in names:
+            r = run_isolated(measure_solver, name, points, steps)
+            print(
+                f"{name:>8} {points:>8} {r['setup_s']:>9.3f}s "
+                f"{r['step_s'] * 1000:>8.2f}ms {r['peak_rss'] / 2**20:>9.1f}"
+            )
+
+
+def measure_integrator(name, points, steps):
+    coeff = 0.2
+    temps = np.random.default_rng(0).uniform(273, 1000, (points, points))
+    start = time.perf_counter()
+    match name:
+        case "euler":
+            solve = get_solver("lu", points, coeff)
+            next_temps = backwards_euler.next_temps
+        case "adi":
+            solve = adi.gen_banded_matrix(points - 2, coeff)
+            next_temps = adi.next_temps
+    setup_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(steps):
+        temps = next_temps(solve, temps, coeff)
+    step_time = (time.perf_counter() - start) / steps
+    return {
+        "integrator": name,
+        "points": points,
+        "setup_s": setup_time,
+        "step_s": step_time,
+        "peak_rss": peak_rss(),
+    }
+
+
+def integrator_comparison(sizes, steps):
+    print(f"{'method':>8} {'points':>8} {'setup':>10} {'step':>10} {'peak MiB':>9}")
+    for points in sizes:
+        for name in ("euler", "adi"):
+            r = run_isolated(measure_integrator, name, points, steps)
+            print(
+                f"{name:>8} {points:>8} {r['setup_s']:>9.3f}s "
+                f"{r['step_s'] * 1000:>8.2f}ms {r['peak_rss'] / 2**20:>9.1f}"
+            )
+
+
+def quadrant_map(points, temps):
+    heat_map = np.empty((points, points))
+    midpoint = points // 2
+    heat_map[:midpoint, :midpoint] = temps[0]
+    heat_map[:midpoint, midpoint:] = temps[1]
+    heat_map[midpoint:, :midpoint] = temps[2]
+    heat_map[midpoint:, midpoint:] = temps[3]
+    return heat_map
+
+
+def exact_temps(initial_map, rate, duration):
+    # Exact solution of the spatially discretized system: u_s + exp(-rate t K)(u0 - u_s)
+    n = len(initial_map) - 2
+    eigenvalues = laplacian_eigenvalues(n)
+    border = initial_map.copy()
+    border[1:-1, 1:-1] = 0
+    boundary = backwards_euler.gen_known_vector(border, 1.0).reshape(n, n)
+    steady = fft.dstn(fft.dstn(boundary, type=1, norm="ortho") / eigenvalues, type=1, norm="ortho")
+    spectrum = fft.dstn(initial_map[1:-1, 1:-1] - steady, type=1, norm="ortho")
+    spectrum *= np.exp(-rate * duration * eigenvalues)
+    temps = initial_map.copy()
+    temps[1:-1, 1:-1] = steady + fft.dstn(spectrum, type=1, norm="ortho")
+    return temps
+
+
+def time_to_target(points, duration, dt, runs):
+    initial_map = quadrant_map(points, (300, 900, 500, 700))
+    plate = Plate(initial_map, points, 0.5)
+    plate.gen_material_properties("aluminum")
+    reference = exact_temps(initial_map, plate.diffusivity / plate.dr**2, duration)
+    print(f"{'method':>16} {'tolerance':>10} {'wall':>9} {'steps':>7} {'max error':>10}")
+    for integrator, tolerance in runs:
+        plate = Plate(initial_map, points, 0.5, integrator=integrator)
+        plate.gen_material_properties("aluminum")
+        start = time.perf_counter()
+        if tolerance is None:
+            plate.gen_solver(dt)
+            steps = round(duration / dt)
+            for _ in range(steps):
+                plate.update()
+            label = f"{integrator} fixed"
+        else:
+            stepper = AdaptiveStepper(plate, dt, tolerance)
+            stepper.advance(duration)
+            steps = stepper.accepted
+            label = f"{integrator} adaptive"
+        wall = time.perf_counter() - start
+        error = np.abs(plate.heat_map - reference).max()
+        print(f"{label:>16} {str(tolerance):>10} {wall:>8.3f}s {steps:>7} {error:>9.4f}K")
+
+
+def transient_bytes(fn, repeats):
+    # Largest amount of memory allocated on top of what was live before a call
+    worst = 0
+    for _ in range(repeats):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        worst = max(worst, peak - current)
+    return worst
+
+
+def step_allocations(points, steps, runs):
+    print(f"{'method':>10} {'step':>12} {'solver':>12} {'engine':>10} {'retained':>10}")
+    initial_map = quadrant_map(points, (300, 900, 500, 700))
+    for integrator, solver in runs:
+        plate = Plate(initial_map, points, 0.5, solver, integrator=integrator)
+        plate.gen_material_properties("aluminum")
+        plate.gen_solver(0.5)
+        engine = plate.engine
+        plate.update()
+        if integrator == "adi":
+            known = engine.known_x.T
+        else:
+            known = engine.known_vec
+        solve = engine.solve
+        tracemalloc.start()
+        start_current, _ = tracemalloc.get_traced_memory()
+        step_bytes = transient_bytes(plate.update, steps)
+        retained = tracemalloc.get_traced_memory()[0] - start_current
+        solver_bytes = transient_bytes(lambda: solve(known.copy()), steps) - known.nbytes
+        # The engine on its own, with a solve that hands back its input without allocating
+        engine.solve = lambda b: b
+        engine_bytes = transient_bytes(plate.update, steps)
+        engine.solve = solve
+        tracemalloc.stop()
+        label = integrator if integrator == "adi" else f"{integrator}/{solver}"
+        print(
+            f"{label:>10} {step_bytes:>11}B {solver_bytes:>11}B "
+            f"{engine_bytes:>9}B {retained:>9}B"
+        )
+
+
+def ensemble_throughput(points, member_counts, steps, solver):
+    print(f"{'members':>8} {'mode':>10} {'setup':>10} {'member-steps/s':>15}")
+    rng = np.random.default_rng(0)
+    for members in member_counts:
+        initial_maps = [quadrant_map(points, rng.uniform(273, 1000, 4)) for _ in range(members)]
+        # One plate per run, each paying for its own factorization as separate runs would
+        setup_time = 0
+        step_time = 0
+        for initial_map in initial_maps:
+            factor_cache.clear()
+            start = time.perf_counter()
+            plate = Plate(initial_map, points, 0.5, solver)
+            plate.gen_material_properties("aluminum")
+            plate.gen_solver(0.5)
+            setup_time += time.perf_counter() - start
+            start = time.perf_counter()
+            plate.advance(steps)
+            step_time += time.perf_counter() - start
+        print(f"{members:>8} {'single':>10} {setup_time:>9.3f}s {members * steps / step_time:>15.1f}")
+        factor_cache.clear()
+        start = time.perf_counter()
+        ensemble = EnsemblePlate(initial_maps, points, 0.5, solver)
+        ensemble.gen_material_properties("aluminum")
+        ensemble.gen_solver(0.5)
+        setup_time = time.perf_counter() - start
+        start = time.perf_counter()
+        ensemble.advance(steps)
+        step_time = time.perf_counter() - start
+        print(f"{members:>8} {'ensemble':>10} {setup_time:>9.3f}s {members * steps / step_time:>15.1f}")
+
+
+def generation_times(sizes, functions, repeats):
+    print(f"{'function':>16} {'points':>8} {'time':>10} {'ns/cell':>8}")
+    for function in functions:
+        fn = getattr(gen, f"{function}_map")
+        for points in sizes:
+            best = float("inf")
+            for seed in range(repeats):
+                start = time.perf_counter()
+                fn(points, 273, 1000, seed)
+                best = min(best, time.perf_counter() - start)
+            print(f"{function:>16} {points:>8} {best:>9.4f}s {best / points**2 * 1e9:>8.1f}")
+
+
+def explicit_crossover(sizes, dts, solver, steps):
+    # Per-step cost of the explicit backend against Backward Euler as dt grows, next to the
+    # integrator auto would pick; the per-cell columns are what explicit.py's estimates are
+    print(
+        f"{'points':>8} {'dt':>8} {'substeps':>9} {'ftcs':>10} {'ns/cell':>8} "
+        f"{'euler/' + solver:>10} {'ns/cell':>8} {'auto':>6}"
+    )
+    for points in sizes:
+        initial_map = quadrant_map(points, (300, 900, 500, 700))
+        cells = (points - 2) ** 2
+        for dt in dts:
+            times = {}
+            for integrator in ("ftcs", "euler"):
+                plate = Plate(initial_map, points, 0.5, solver, integrator=integrator)
+                plate.gen_material_properties("aluminum")
+                plate.gen_solver(dt)
+                plate.update()
+                start = time.perf_counter()
+                plate.advance(steps)
+                times[integrator] = (time.perf_counter() - start) / steps
+            coeff = plate.coeff
+            count = explicit.substeps(coeff)
+            print(
+                f"{points:>8} {dt:>8} {count:>9} {times['ftcs'] * 1000:>8.2f}ms "
+                f"{times['ftcs'] / (count * cells) * 1e9:>8.1f} {times['euler'] * 1000:>8.2f}ms "
+                f"{times['euler'] / cells * 1e9:>8.1f} {explicit.choose_integrator(points, coeff, solver):>6}"
+            )
+
+
+def boundary_overhead(sizes, runs, steps):
+    # Per-step cost with every edge scheduled (a heating cycle, a ramp and two sampled profiles
+    # along the edge) against constant edges, on the same solver
+    print(f"{'method':>10} {'points':>8} {'constant':>10} {'scheduled':>10} {'overhead':>9}")
+    for points in sizes:
+        initial_map = quadrant_map(points, (300, 900, 500, 700))
+        times = np.linspace(0, 60, 7)
+        profile = np.random.default_rng(0).uniform(273, 1000, (len(times), points - 2))
+        edges = {
+            "bottom": EdgeSchedule([0, 30, 60], [300, 1200, 300], period=60),
+            "top": EdgeSchedule([0, 100], [273, 600]),
+            "left": EdgeSchedule(times, profile),
+            "right": EdgeSchedule(times, profile[::-1], period=60),
+        }
+        for integrator, solver in runs:
+            costs = []
+            for boundary in (None, BoundarySchedule(edges, points)):
+                factor_cache.clear()
+                plate = Plate(initial_map, points, 0.5, solver, integrator=integrator)
+                plate.gen_material_properties("aluminum")
+                plate.gen_solver(0.5)
+                plate.set_boundary(boundary)
+                plate.advance(1)
+                start = time.perf_counter()
+                plate.advance(steps)
+                costs.append((time.perf_counter() - start) / steps)
+            label = integrator if integrator in ("adi", "ftcs") else f"{integrator}/{solver}"
+            print(
+                f"{label:>10} {points:>8} {costs[0] * 1000:>8.3f}ms {costs[1] * 1000:>8.3f}ms "
+                f"{(costs[1] / costs[0] - 1) * 100:>8.1f}%"
+            )
+
+
+def layout_assembly(sizes, material, repeats):
+    # Assembly of a plate of several materials against the constant-coefficient matrix: the
+    # per-cell properties and face conductivities, then the variable-coefficient matrix
+    print(f"{'points':>8} {'cells':>10} {'constant':>10} {'layout':>10} {'variable':>10} {'ns/cell':>8}")
+    for points in sizes:
+        n = points - 2
+        best = [float("inf")] * 3
+        for _ in range(repeats):
+            start = time.perf_counter()
+            gen_coeff_matrix(n, 1 + 4 * 0.5, -0.5)
+            middle = time.perf_counter()
+            layout = gen_layout(material, points)
+            end = time.perf_counter()
+            layout.matrix(0.5)
+            times = (middle - start, end - middle, time.perf_counter() - end)
+            best = [min(b, t) for b, t in zip(best, times)]
+        print(
+            f"{points:>8} {n * n:>10} {best[0]:>9.3f}s {best[1]:>9.3f}s {best[2]:>9.3f}s "
+            f"{(best[1] + best[2]) / (n * n) * 1e9:>8.1f}"
+        )
+
+
+def import_times(module):
+    # (name, depth, self, cumulative) in microseconds for every module a fresh interpreter
+    # imports along with module, as reported by -X importtime
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        fields = line.removeprefix("import time:").split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        entries.append((name.strip(), (len(name) - len(name.lstrip())) // 2, int(fields[0]), int(fields[1])))
+    return entries
+
+
+def start_time(code, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def startup_report(modules, repeats, top):
+    # Wall time to start each entry point and import its modules, with its slowest direct
+    # imports. Importing any of DEFERRED_MODULES up front fails the run
+    interpreter = start_time("pass", repeats)
+    print(f"Interpreter: {interpreter * 1000:.0f}ms")
+    failures = []
+    for module in modules:
+        entries = import_times(module)
+        wall = start_time(f"import {module}", repeats) - interpreter
+        print(f"{module}: {entries[-1][3] / 1000:.1f}ms importing, {wall * 1000:.0f}ms wall")
+        direct = sorted((entry for entry in entries if entry[1] == 1), key=lambda entry: entry[3], reverse=True)
+        for name, _, own, cumulative in direct[:top]:
+            print(f"  {name:<28} {cumulative / 1000:>8.1f}ms {own / 1000:>8.1f}ms self")
+        deferred = sorted({entry[0].split(".")[0] for entry in entries} & set(DEFERRED_MODULES))
+        if deferred:
+            failures.append(f"{module} imports {' and '.join(deferred)} at startup.")
+    for failure in failures:
+        print("[FAIL]", failure)
+    if failures:
+        sys.exit(1)
+
+
+def time_stage(fn, repeats):
+    # Best of repeats for the time, then one more run under tracemalloc for the largest
+    # amount allocated on top of what was live, so tracing does not slow the timed runs.
+    # Allocations made in C (SuperLU's factors) only show up in how far the first run raised
+    # the peak RSS of the process
+    best = float("inf")
+    rss = None
+    for _ in range(repeats):
+        before = peak_rss()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+        if rss is None:
+            rss = peak_rss() - before
+    tracemalloc.start()
+    peak = transient_bytes(fn, 1)
+    tracemalloc.stop()
+    return best, peak, rss
+
+
+def measure_stages(points, repeats, factor_limit):
+    # Every stage of the pipeline at one size, each timed on its own
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from render import Renderer, stride
+
+    n = points - 2
+    coeff = 0.2
+    stages = {}
+
+    def run(stage, fn):
+        seconds, peak, rss = time_stage(fn, repeats)
+        stages[stage] = {"seconds": seconds, "peak_bytes": peak, "rss_growth": rss}
+
+    for function in GENERATORS:
+        fn = getattr(gen, f"{function}_map")
+        run(f"gen_{function}", lambda: fn(points, 273, 1000, 0))
+    heat_map = gen.poly_map(points, 273, 1000, 0)
+    run("gen_coeff_matrix", lambda: gen_coeff_matrix(n, 1 + 4 * coeff, -coeff))
+    csr = gen_coeff_matrix(n, 1 + 4 * coeff, -coeff).tocsr()
+    run("csc", csr.tocsc)
+    csc = csr.tocsc()
+    del csr
+    if points <= factor_limit:
+        run("factorized", lambda: spl.factorized(csc))
+        plate = Plate(heat_map, points, 0.5)
+        plate.gen_material_properties("aluminum")
+        plate.gen_solver(0.5)
+        run("update", plate.update)
+    del csc
+    run("total_energy", lambda: ut.total_energy(2700, 897, heat_map, 1e-6))
+    renderer = Renderer(heat_map, points, 273, 1000)
+    step = stride(points, renderer.pixels())
+    # A live frame: downsampled to the window as the solver publishes it, then blitted
+    run("render", lambda: renderer.draw(heat_map[::step, ::step].copy(), ""))
+    renderer.close()
+    return {"points": points, "stages": stages, "peak_rss": peak_rss()}
+
+
+def machine():
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+    }
+
+
+def compare(results, baseline, ratio):
+    # Every stage and size found in both runs; a time or peak allocation more than ratio times
+    # the baseline (and more than the noise floor above it) is a regression
+    previous = {(r["points"], stage): values for r in baseline["results"] for stage, values in r["stages"].items()}
+    regressions = []
+    print(f"{'stage':>20} {'points':>8} {'baseline':>10} {'now':>10} {'ratio':>7}")
+    for r in results:
+        for stage, values in r["stages"].items():
+            old = previous.get((r["points"], stage))
+            if old is None:
+                continue
+            change = values["seconds"] / old["seconds"] if old["seconds"] > 0 else 1.0
+            print(f"{stage:>20} {r['points']:>8} {old['seconds']:>9.4f}s {values['seconds']:>9.4f}s {change:>6.2f}x")
+            if values["seconds"] > ratio * old["seconds"] and values["seconds"] - old["seconds"] > REGRESSION_SECONDS:
+                regressions.append(f"{stage} at {r['points']} points took {values['seconds']:.4f}s against {old['seconds']:.4f}s")
+            if values["peak_bytes"] > ratio * old["peak_bytes"] and values["peak_bytes"] - old["peak_bytes"] > REGRESSION_BYTES:
+                regressions.append(
+                    f"{stage} at {r['points']} points allocated {values['peak_bytes'] / 2**20:.1f}MiB "
+                    f"against {old['peak_bytes'] / 2**20:.1f}MiB"
+                )
+    return regressions
+
+
+def pipeline_suite(sizes, repeats, factor_limit, output, baseline_path, save, ratio):
+    print(f"{'stage':>20} {'points':>8} {'time':>10} {'ns/cell':>8} {'peak MiB':>9} {'RSS MiB':>8}")
+    results = []
+    for points in sizes:
+        r = run_isolated(measure_stages, points, repeats, factor_limit)
+        results.append(r)
+        for stage, values in r["stages"].items():
+            print(
+                f"{stage:>20} {points:>8} {values['seconds']:>9.4f}s "
+                f"{values['seconds'] / points**2 * 1e9:>8.1f} {values['peak_bytes'] / 2**20:>9.1f} "
+                f"{values['rss_growth'] / 2**20:>8.1f}"
+            )
+        print(f"{'process peak RSS':>20} {points:>8} {'':>10} {'':>8} {'':>9} {r['peak_rss'] / 2**20:>8.1f}")
+    report = {"machine": machine(), "repeats": repeats, "results": results}
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+    if save:
+        with open(baseline_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved the baseline to {baseline_path}.")
+        return
+    if not os.path.exists(baseline_path):
+        # A run with nothing to compare against must not pass as free of regressions
+        print(f"[FAIL] No baseline at {baseline_path} to compare against; store one with --save.")
+        sys.exit(1)
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline["machine"] != report["machine"]:
+        print("[WARN] The baseline was recorded on a different machine or library versions.")
+    regressions = compare(results, baseline, ratio)
+    for regression in regressions:
+        print("[FAIL]", regression)
+    if regressions:
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="heatism benchmarks")
+    subs = parser.add_subparsers(dest="cmd", required=True)
+
+    scaling_cmd = subs.add_parser("scaling", help="setup time and peak RSS of matrix assembly against points")
+    scaling_cmd.add_argument("-p", "--points", type=int, nargs="+", default=[100, 200, 300, 500, 700])
+
+    solvers_cmd = subs.add_parser("solvers", help="setup and per-step time of each solver backend")
+    solvers_cmd.add_argument("-p", "--points", type=int, nargs="+", default=[100, 300, 500])
+    solvers_cmd.add_argument("-S", "--solvers", type=str, nargs="+", default=list(SOLVERS))
+    solvers_cmd.add_argument("-n", "--steps", type=int, default=20)
+
+    adi_cmd = subs.add_parser("adi", help="ADI against Backward Euler with sparse LU")
+    adi_cmd.add_argument("-p", "--points", type=int, nargs="+", default=[100, 300, 500])
+    adi_cmd.add_argument("-n", "--steps", type=int, default=20)
+
+    adaptive_cmd = subs.add_parser("adaptive", help="wall time and error to reach a simulated time")
+    adaptive_cmd.add_argument("-p", "--points", type=int, default=100)
+    adaptive_cmd.add_argument("-T", "--duration", type=float, default=120)
+    adaptive_cmd.add_argument("-t", "--time", type=float, default=0.5)
+
+    allocations_cmd = subs.add_parser("allocations", help="per-step allocations of the step engines against their solvers")
+    allocations_cmd.add_argument("-p", "--points", type=int, default=100)
+    allocations_cmd.add_argument("-n", "--steps", type=int, default=20)
+
+    ensemble_cmd = subs.add_parser("ensemble", help="member-steps per second of single plates against one ensemble")
+    ensemble_cmd.add_argument("-p", "--points", type=int, default=200)
+    ensemble_cmd.add_argument("-m", "--members", type=int, nargs="+", default=[1, 4, 16, 64])
+    ensemble_cmd.add_argument("-n", "--steps", type=int, default=20)
+    ensemble_cmd.add_argument("-S", "--solver", type=str, default="lu")
+
+    generators_cmd = subs.add_parser("generators", help="time to generate each initial condition")
+    generators_cmd.add_argument("-p", "--points", type=int, nargs="+", default=[100, 1000, 3000])
+    generators_cmd.add_argument("-f", "--functions", type=str, nargs="+", default=GENERATORS)
+    generators_cmd.add_argument("-r", "--repeats", type=int, default=3)
+
+    explicit_cmd = subs.add_parser("explicit", help="explicit sub-stepping against Backward Euler as dt grows")
+    explicit_cmd.add_argument("-p", "--points", type=int, nargs="+", default=[100, 300, 1000])
+    explicit_cmd.add_argument("-t", "--time", type=float, nargs="+", default=[0.01, 0.05, 0.2, 1.0])
+    explicit_cmd.add_argument("-S", "--solver", type=str, default="lu")
+    explicit_cmd.add_argument("-n", "--steps", type=int, default=5)
+
+    boundary_cmd = subs.add_parser("boundary", help="per-step cost of scheduled edges against constant ones")
+    boundary_cmd.add_argument("-p", "--points", type=int, nargs="+", default=[100, 300, 1000])
+    boundary_cmd.add_argument("-n", "--steps", type=int, default=20)
+
+    materials_cmd = subs.add_parser("materials", help="assembly of plates of several materials against one material")
+    materials_cmd.add_argument("-p", "--points", type=int, nargs="+", default=[100, 300, 1000, 2000])
+    materials_cmd.add_argument("-m", "--material", type=str, default="copper,iron,gold,silver")
+    materials_cmd.add_argument("-r", "--repeats", type=int, default=3)
+
+    startup_cmd = subs.add_parser("startup", help="import time of each entry point, failing if it loads scipy or matplotlib up front")
+    startup_cmd.add_argument("-m", "--modules", type=str, nargs="+", default=STARTUP_MODULES)
+    startup_cmd.add_argument("-r", "--repeats", type=int, default=5)
+    startup_cmd.add_argument("-t", "--top", type=int, default=8, help="slowest direct imports to list")
+
+    suite_cmd = subs.add_parser("suite", help="every stage of the pipeline against points, compared with a stored baseline")
+    suite_cmd.add_argument("-p", "--points", type=int, nargs="+", default=[50, 100, 300, 1000, 3000])
+    suite_cmd.add_argument("-r", "--repeats", type=int, default=3)
+    suite_cmd.add_argument("-l", "--factor-limit", type=int, default=FACTOR_LIMIT, help="largest points to factorize and step")
+    suite_cmd.add_argument("-o", "--output", type=str, help="write the results to this JSON file")
+    suite_cmd.add_argument("-b", "--baseline", type=str, default=str(BASELINE_PATH), help="JSON results to compare against")
+    suite_cmd.add_argument("-s", "--save", action="store_true", help="store the results as the baseline instead of comparing")
+    suite_cmd.add_argument("-x", "--ratio", type=float, default=REGRESSION_RATIO, help="slowdown or growth that fails the comparison")
+
+    args = parser.parse_args(argv)
+    match args.cmd:
+        case "scaling":
+            points_scaling(args.points)
+        case "solvers":
+            solver_comparison(args.points, args.solvers, args.steps)
+        case "adi":
+            integrator_comparison(args.points, args.steps)
+        case "adaptive":
+            runs = [("euler", None), ("cn", None), ("euler", 0.1), ("cn", 0.1), ("cn", 0.01)]
+            time_to_target(args.points, args.duration, args.time, runs)
+        case "allocations":
+            runs = [("euler", "lu"), ("euler", "dst"), ("euler", "cg"), ("cn", "lu"), ("adi", "lu")]
+            step_allocations(args.points, args.steps, runs)
+        case "ensemble":
+            ensemble_throughput(args.points, args.members, args.steps, args.solver)
+        case "generators":
+            generation_times(args.points, args.functions, args.repeats)
+        case "explicit":
+            explicit_crossover(args.points, args.time, args.solver, args.steps)
+        case "boundary":
+            runs = [("euler", "lu"), ("euler", "dst"), ("cn", "lu"), ("adi", "lu"), ("ftcs", "lu")]
+            boundary_overhead(args.points, runs, args.steps)
+        case "materials":
+            layout_assembly(args.points, args.material, args.repeats)
+        case "startup":
+            startup_report(args.modules, args.repeats, args.top)
+        case "suite":
+            pipeline_suite(args.points, args.repeats, args.factor_limit, args.output, args.baseline, args.save, args.ratio)
+
+
+if __name__ == "__main__":
+    main()
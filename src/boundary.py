@@ -0,0 +1,131 @@
+from bisect import bisect_right
+import numpy as np
+from exceptions import ParameterError, JsonFileError
+import utils as ut
+
+# Row 0 is drawn at the bottom. The corners belong to the top and bottom edges; no interior
+# point depends on them
+EDGES = ("bottom", "top", "left", "right")
+# When within a step the borders are evaluated: at its end for Backward Euler and Crank-Nicolson
+# (which also keeps the borders the step started from), and at its midpoint for the split
+# and sub-stepped integrators
+BOUNDARY_TIME = {
+    "euler": 1.0,
+    "cn": 1.0,
+    "adi": 0.5,
+    "ftcs": 0.5,
+}
+
+
+def edge_view(temps, edge):
+    match edge:
+        case "bottom":
+            return temps[..., 0, :]
+        case "top":
+            return temps[..., -1, :]
+        case "left":
+            return temps[..., 1:-1, 0]
+        case "right":
+            return temps[..., 1:-1, -1]
+    raise ParameterError(f"unknown edge {edge}.")
+
+
+def load_csv(path):
+    # Columns of time and then either one temperature or one per point along the edge. A header
+    # row is skipped if there is one
+    try:
+        with open(path) as f:
+            first = f.readline()
+        try:
+            [float(value) for value in first.split(",")]
+            header = 0
+        except ValueError:
+            header = 1
+        samples = np.loadtxt(path, delimiter=",", skiprows=header, ndmin=2)
+    except (OSError, ValueError) as e:
+        raise ParameterError(f"could not read boundary profile {path}: {e}.")
+    return samples[:, 0], samples[:, 1:]
+
+
+class EdgeSchedule:
+    # Temperatures of one edge against time, linear between samples and held past the last one
+    # unless repeated with a period. Samples are either one temperature each or one for every
+    # point along the edge
+    def __init__(self, times, temps, period=None):
+        self.times = np.asarray(times, dtype=float)
+        self.temps = np.asarray(temps, dtype=float)
+        if self.temps.ndim == 2 and self.temps.shape[1] == 1:
+            self.temps = self.temps[:, 0]
+        if self.times.ndim != 1 or len(self.times) == 0 or len(self.times) != len(self.temps):
+            raise ParameterError("a boundary schedule needs one temperature sample per time.")
+        if np.any(np.diff(self.times) < 0):
+            raise ParameterError("boundary schedule times must be increasing.")
+        if period is not None and period <= 0:
+            raise ParameterError("the period of a boundary schedule must be positive.")
+        self.period = period
+        # Looked up with plain floats, which is most of the cost of a step's worth of edges
+        self.sample_times = self.times.tolist()
+        self.steps = np.diff(self.temps, axis=0)
+
+    def __call__(self, time):
+        if self.period is not None:
+            time = self.times[0] + (time - self.times[0]) % self.period
+        if self.temps.ndim == 1:
+            return np.interp(time, self.times, self.temps)
+        # Every point of the edge interpolated at once between the two samples around time
+        times = self.sample_times
+        i = bisect_right(times, time)
+        if i == 0:
+            return self.temps[0]
+        if i == len(times):
+            return self.temps[-1]
+        weight = (time - times[i - 1]) / (times[i] - times[i - 1])
+        return self.temps[i - 1] + weight * self.steps[i - 1]
+
+
+def gen_edge(config):
+    # A number, {"times": [...], "temps": [...], "period": p}, or {"csv": path, "period": p}
+    if isinstance(config, (int, float)):
+        return EdgeSchedule([0.0], [config])
+    if not isinstance(config, dict):
+        raise ParameterError(f"could not decode boundary schedule {config}.")
+    if "csv" in config:
+        times, temps = load_csv(config["csv"])
+    else:
+        try:
+            times, temps = config["times"], config["temps"]
+        except KeyError as e:
+            raise ParameterError(f"boundary schedule is missing {e}.")
+    return EdgeSchedule(times, temps, config.get("period"))
+
+
+class BoundarySchedule:
+    # Scheduled temperatures for any of the four edges. The edges only enter the right hand side
+    # of each step, so applying a schedule costs O(points) per step and never a refactorization
+    def __init__(self, edges, points):
+        for edge, schedule in edges.items():
+            if edge not in EDGES:
+                raise ParameterError(f"unknown edge {edge}.")
+            length = points if edge in ("bottom", "top") else points - 2
+            if schedule.temps.ndim == 2 and schedule.temps.shape[1] != length:
+                raise ParameterError(f"the {edge} edge has {length} points, not {schedule.temps.shape[1]}.")
+        self.edges = edges
+
+    def apply(self, temps, time):
+        for edge, schedule in self.edges.items():
+            edge_view(temps, edge)[...] = schedule(time)
+
+
+def gen_boundary(config, points):
+    return BoundarySchedule({edge: gen_edge(value) for edge, value in config.items() if value is not None}, points)
+
+
+def load_boundary(path, points):
+    try:
+        config = ut.load_json(path)
+    except JsonFileError as e:
+        # A bad schedule file should not take the simulation down with it
+        raise ParameterError(str(e))
+    if not isinstance(config, dict):
+        raise ParameterError(f"{path} should map edges to their schedules.")
+    return gen_boundary(config, points)
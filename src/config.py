@@ -0,0 +1,10 @@
+from pathlib import Path
+
+base_dir = Path(__file__).parent
+config_dir = base_dir.parent / "configs"
+gen_dir = base_dir / "gen"
+
+DEFAULTS_PATH = config_dir / "defaults.json"
+MATERIALS_PATH = config_dir / "materials.json"
+BASELINE_PATH = config_dir / "bench_baseline.json"
+FUNCTIONS_PATH = gen_dir / "functions.json"
@@ -0,0 +1,40 @@
+import numpy as np
+from backwards_euler import gen_boundary_vector, update_boundary_vector, neighbour_sum
+
+
+class StepEngine:
+    def __init__(self, solve_matrix, temps, r):
+        n = len(temps) - 2
+        self.solve = solve_matrix
+        self.r = r
+        # Explicit and implicit halves each contribute r / 2 of the borders, the explicit half
+        # those the step starts from and the implicit half those it ends at
+        self.boundary = gen_boundary_vector(temps, r)
+        self.start_boundary = gen_boundary_vector(temps, r / 2)
+        self.end_boundary = self.start_boundary.copy()
+        self.known = np.empty((n, n), dtype=temps.dtype)
+        self.known_vec = self.known.reshape(-1)
+        self.inner = np.empty((n, n), dtype=temps.dtype)
+        self.neighbours = np.empty((n, n), dtype=temps.dtype)
+
+    def set_boundary(self, temps, restart=False):
+        # The borders the next step ends at; the ones it starts from are those of the last call
+        if restart:
+            update_boundary_vector(self.end_boundary, temps, self.r / 2)
+        self.start_boundary, self.end_boundary = self.end_boundary, self.start_boundary
+        update_boundary_vector(self.end_boundary, temps, self.r / 2)
+        np.add(self.start_boundary, self.end_boundary, out=self.boundary)
+
+    def __call__(self, temps):
+        inner_points = temps[1:-1, 1:-1]
+        np.copyto(self.inner, inner_points)
+        neighbours = self.neighbours
+        neighbours.fill(0)
+        neighbour_sum(self.inner, neighbours, 0)
+        neighbour_sum(self.inner, neighbours, 1)
+        neighbours *= self.r / 2
+        np.multiply(self.inner, 1 - 2 * self.r, out=self.known)
+        self.known += neighbours
+        self.known += self.boundary
+        inner_points[...] = self.solve(self.known_vec).reshape(self.known.shape)
+        return temps
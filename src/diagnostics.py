@@ -0,0 +1,118 @@
+from collections import deque, namedtuple
+import numpy as np
+
+DIAGNOSTICS_EVERY = 1
+DIAGNOSTICS_HISTORY = 100000
+# Weight of the end-of-step flux in the energy balance, i.e. the theta of each integrator
+FLUX_WEIGHTS = {
+    "euler": 1.0,
+    "cn": 0.5,
+    # Scheduled borders are applied at the middle of each adi and ftcs step, so for those the
+    # balance against sampled fluxes is only approximate while they change
+    "adi": 0.5,
+    # Explicit, but sub-stepped between samples, so the trapezoid of the sampled fluxes
+    "ftcs": 0.5,
+}
+
+Sample = namedtuple("Sample", ["step", "time", "energy", "mean", "min", "max", "flux", "imbalance"])
+
+
+def boundary_gradient(temps):
+    # Sum over every border face of (border temperature - adjacent interior temperature), which
+    # is what the five-point Laplacian summed over the interior telescopes to
+    return (
+        (temps[0, 1:-1] - temps[1, 1:-1]).sum(dtype=float)
+        + (temps[-1, 1:-1] - temps[-2, 1:-1]).sum(dtype=float)
+        + (temps[1:-1, 0] - temps[1:-1, 1]).sum(dtype=float)
+        + (temps[1:-1, -1] - temps[1:-1, -2]).sum(dtype=float)
+    )
+
+
+class Diagnostics:
+    # Reductions of the interior of the heat map sampled every `every` steps into a bounded time
+    # series; the fixed Dirichlet borders are left out of the energy, mean and range. The
+    # interior energy is checked against the heat that entered through the Dirichlet borders,
+    # which is exact to round-off for euler and cn when sampling every step
+    def __init__(self, plate, thickness, every=DIAGNOSTICS_EVERY, history=DIAGNOSTICS_HISTORY):
+        self.every = every
+        self.samples = deque(maxlen=history)
+        self.reset(plate, thickness)
+
+    def reset(self, plate, thickness):
+        self.plate = plate
+        self.thickness = thickness
+        self.steps = 0
+        self.pending = 0
+        self.samples.clear()
+        self.interior_energy = None
+        self.start_energy = None
+        self.inflow = 0.0
+        self.record()
+
+    def record(self):
+        plate = self.plate
+        temps = plate.heat_map
+        n = plate.points - 2
+        volume = plate.dr**2 * self.thickness
+        inner_points = temps[1:-1, 1:-1]
+        # Accumulated in double precision, so a float32 plate still balances to its own round-off
+        interior = inner_points.sum(dtype=float)
+        # Heat flowing in through the borders in watts, k * thickness * gradient summed over faces
+        if plate.layout is None:
+            capacity = plate.p * plate.c
+            interior_heat = capacity * interior
+            conduction = plate.diffusivity * capacity * boundary_gradient(temps)
+        else:
+            # Each cell with its own ρc, and each border face with its own conductivity
+            interior_heat = plate.layout.interior_heat(temps)
+            conduction = plate.layout.border_flux(temps)
+        flux = self.thickness * conduction
+        interior_energy = volume * interior_heat
+        if self.start_energy is None:
+            self.start_energy = interior_energy
+        else:
+            last = self.samples[-1]
+            theta = FLUX_WEIGHTS.get(plate.integrator, 0.5)
+            self.inflow += (plate.time - last.time) * (theta * flux + (1 - theta) * last.flux)
+        self.interior_energy = interior_energy
+        self.samples.append(
+            Sample(
+                self.steps,
+                plate.time,
+                interior_energy,
+                interior / n**2,
+                inner_points.min(),
+                inner_points.max(),
+                flux,
+                interior_energy - self.start_energy - self.inflow,
+            )
+        )
+        self.pending = 0
+
+    def stepped(self, steps=1):
+        self.steps += steps
+        self.pending += steps
+        if self.pending >= self.every:
+            self.record()
+
+    def due(self):
+        return self.every - self.pending
+
+    def latest(self):
+        return self.samples[-1]
+
+    def relative_imbalance(self):
+        # Energy balance residual as a fraction of the heat exchanged with the borders so far
+        # (floored well above round-off, for plates whose borders barely exchange any heat)
+        sample = self.latest()
+        scale = max(
+            abs(self.inflow),
+            abs(self.interior_energy - self.start_energy),
+            1e-9 * abs(self.interior_energy),
+        )
+        if scale == 0:
+            return 0.0
+        return abs(sample.imbalance) / scale
+
+    def series(self, field):
+        return np.array([getattr(sample, field) for sample in self.samples])
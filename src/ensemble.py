@@ -0,0 +1,65 @@
+import numpy as np
+import backwards_euler
+from exceptions import ParameterError
+from plate import Plate, BuiltSolver, PRECISIONS
+from solvers import get_solver
+import gen.initial_gen as gen
+
+ENSEMBLE_SOLVERS = ("lu", "dst")
+
+
+class EnsemblePlate(Plate):
+    # A stack of heat maps with the same material, grid and time step. Every member shares one
+    # factorization and all of them are advanced by a single multiple right hand side solve
+    def __init__(self, initial_heat_maps, points, side_length, solver="lu", precision="float64"):
+        super().__init__(np.asarray(initial_heat_maps, dtype=precision), points, side_length, solver)
+        self.members = len(self.heat_map)
+
+    def build_solver(self, dt, diffusivity=None, integrator=None, solver=None, layout=None):
+        if diffusivity is None:
+            diffusivity, layout = self.diffusivity, self.layout
+        if layout is not None:
+            raise ParameterError("ensembles only support plates of a single material.")
+        integrator = integrator or self.integrator
+        solver = solver or self.solver
+        if integrator != "euler":
+            raise ParameterError(f"ensembles only support the euler integrator, not {integrator}.")
+        if solver not in ENSEMBLE_SOLVERS:
+            raise ParameterError(f"ensembles only support the {' and '.join(ENSEMBLE_SOLVERS)} solvers, not {solver}.")
+        coeff = diffusivity * dt / (self.dr**2)
+        solve = get_solver(solver, self.points, coeff, dtype=self.heat_map.dtype)
+        engine = backwards_euler.StepEngine(solve, self.heat_map, coeff)
+        return BuiltSolver(dt, diffusivity, integrator, solver, coeff, solve, engine)
+
+    def stats(self, thickness):
+        dv = self.dr**2 * thickness
+        means = self.heat_map.mean(axis=(1, 2))
+        mins = self.heat_map.min(axis=(1, 2))
+        maxs = self.heat_map.max(axis=(1, 2))
+        energies = self.p * self.c * dv * self.heat_map.sum(axis=(1, 2), dtype=float)
+        members = {
+            "mean": means,
+            "min": mins,
+            "max": maxs,
+            "energy": energies,
+        }
+        aggregate = {
+            "mean": means.mean(),
+            "std": means.std(),
+            "min": mins.min(),
+            "max": maxs.max(),
+            "energy": energies.mean(),
+        }
+        return members, aggregate
+
+
+def gen_ensemble(members, points, side_length, function, new_min, new_max, solver="lu", seed=None, precision="float64"):
+    if precision not in PRECISIONS:
+        raise ParameterError(f"unknown precision {precision}.")
+    try:
+        fn = getattr(gen, f"{function}_map")
+    except AttributeError:
+        raise ParameterError(f"unknown function name {function}.")
+    rng = np.random.default_rng(seed)
+    initial_maps = [fn(points, new_min, new_max, rng) for _ in range(members)]
+    return EnsemblePlate(initial_maps, points, side_length, solver, precision)
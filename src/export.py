@@ -0,0 +1,200 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from exceptions import InputError, InitializationError, ParameterError
+from recording import Recording
+
+LUT_SIZE = 256
+BLOCK_FRAMES = 16
+MIN_PIXELS = 512
+DEFAULT_FPS = 30
+PNG_COMPRESS_LEVEL = 1
+
+# Set in each worker process by init_worker
+worker_state = {}
+
+
+def gen_lut(cmap="jet", size=LUT_SIZE):
+    # The colormap sampled once into an RGB table, so frames are coloured by indexing
+    import matplotlib
+
+    try:
+        colormap = matplotlib.colormaps[cmap]
+    except KeyError:
+        raise ParameterError(f"unknown colormap {cmap}.")
+    colours = colormap(np.linspace(0, 1, size))[:, :3]
+    return (colours * 255).round().astype(np.uint8)
+
+
+def colourize(heat_map, lut, vmin, vmax, scale=1):
+    # Temperatures to LUT indices on a fixed scale, flipped so row 0 is at the bottom like the
+    # pcolormesh window, then each point blown up to a scale x scale block of pixels
+    levels = len(lut) - 1
+    indices = (heat_map[::-1] - vmin) * (levels / (vmax - vmin))
+    np.clip(indices, 0, levels, out=indices)
+    image = lut[indices.astype(np.intp)]
+    if scale > 1:
+        image = image.repeat(scale, axis=0).repeat(scale, axis=1)
+    return image
+
+
+def auto_scale(points):
+    return max(1, -(-MIN_PIXELS // points))
+
+
+def init_worker(path, lut, vmin, vmax, scale):
+    # Each worker opens the recording itself, so frames are never pickled across processes
+    worker_state.update(recording=Recording(path), lut=lut, vmin=vmin, vmax=vmax, scale=scale)
+
+
+def render_block(indices, directory=None):
+    # Renders frames to PNG files in directory, or returns them as raw RGB bytes for an encoder
+    from PIL import Image
+
+    recording = worker_state["recording"]
+    rendered = []
+    for i in indices:
+        image = colourize(recording[i], worker_state["lut"], worker_state["vmin"], worker_state["vmax"], worker_state["scale"])
+        if directory is None:
+            rendered.append(image.tobytes())
+        else:
+            Image.fromarray(image).save(os.path.join(directory, f"frame_{i:06d}.png"), compress_level=PNG_COMPRESS_LEVEL)
+    return rendered
+
+
+def gen_blocks(frames, block_frames):
+    return [range(start, min(start + block_frames, frames)) for start in range(0, frames, block_frames)]
+
+
+def ordered_results(pool, fn, blocks, window, *args):
+    # Keeps at most `window` blocks in flight and yields their results in order, so memory
+    # stays bounded however long the recording is
+    in_flight = deque()
+    for block in blocks:
+        in_flight.append(pool.submit(fn, block, *args))
+        if len(in_flight) >= window:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
+
+def start_encoder(output, width, height, fps):
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise ParameterError("encoding a video needs ffmpeg on the PATH; export to a directory for an image sequence instead.")
+    command = [
+        ffmpeg, "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+        "-pix_fmt", "yuv420p", "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", output,
+    ]
+    return subprocess.Popen(command, stdin=subprocess.PIPE)
+
+
+def export(path, output, vmin=None, vmax=None, cmap="jet", scale=None, fps=DEFAULT_FPS, workers=None, block_frames=BLOCK_FRAMES):
+    # A directory (or a path without an extension) becomes a PNG sequence, anything else is
+    # encoded by ffmpeg. Returns the number of frames written
+    recording = Recording(path)
+    metadata = recording.metadata
+    frames = len(recording)
+    vmin = metadata["min_temp"] if vmin is None else vmin
+    vmax = metadata["max_temp"] if vmax is None else vmax
+    if vmax <= vmin:
+        raise ParameterError("the maximum temperature of the colour scale must be above the minimum.")
+    scale = scale or auto_scale(metadata["points"])
+    lut = gen_lut(cmap)
+    recording.close()
+    blocks = gen_blocks(frames, block_frames)
+    workers = workers or os.cpu_count()
+    sequence = not os.path.splitext(output)[1]
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(path, lut, vmin, vmax, scale)) as pool:
+        if sequence:
+            os.makedirs(output, exist_ok=True)
+            for _ in ordered_results(pool, render_block, blocks, 2 * workers, output):
+                pass
+            return frames
+        side = metadata["points"] * scale
+        encoder = start_encoder(output, side, side, fps)
+        try:
+            for rendered in ordered_results(pool, render_block, blocks, 2 * workers):
+                for frame in rendered:
+                    encoder.stdin.write(frame)
+        finally:
+            encoder.stdin.close()
+            encoder.wait()
+        if encoder.returncode != 0:
+            raise ParameterError(f"ffmpeg failed to encode {output}.")
+    return frames
+
+
+def record_headless(params, steps, duration, every, seed):
+    # Runs a plate without rendering into a temporary recording to export from
+    import batch
+
+    fd, path = tempfile.mkstemp(suffix=".heat")
+    os.close(fd)
+    batch.run(params, steps, duration, seed=seed, record=path, record_every=every)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="simulation.py export", description="render a recording to an image sequence or video")
+    parser.add_argument("output", type=str, help="directory for a PNG sequence, or a video file (needs ffmpeg)")
+    parser.add_argument("-r", "--recording", type=str, help="recording to export; without it a plate is run headless")
+    parser.add_argument("-f", "--function", type=str, help="function with which to generate the initial heat distribution")
+    parser.add_argument("-p", "--points", type=int, help="number of points per side with which to approximate the plate")
+    parser.add_argument("-m", "--material", type=str, help="material of the plate")
+    parser.add_argument("-t", "--time", dest="dt", type=float, help="time step of the simulation in seconds")
+    parser.add_argument("-i", "--integrator", type=str, help="time integrator (euler, cn, adi, ftcs or auto)")
+    parser.add_argument("-S", "--solver", type=str, help="linear solver backend (lu, dst or cg)")
+    parser.add_argument("--seed", type=int, help="seed for the initial heat distribution")
+    parser.add_argument("-P", "--precision", type=str, help="floating point precision of a headless run (float64 or float32)")
+    parser.add_argument("-k", "--every", type=int, default=1, help="steps between frames of a headless run")
+    horizon = parser.add_mutually_exclusive_group()
+    horizon.add_argument("-n", "--steps", type=int, help="number of steps of a headless run")
+    horizon.add_argument("-T", "--duration", type=float, help="simulated seconds of a headless run")
+    parser.add_argument("--min", dest="vmin", type=float, help="temperature at the bottom of the colour scale, min_temp by default")
+    parser.add_argument("--max", dest="vmax", type=float, help="temperature at the top of the colour scale, max_temp by default")
+    parser.add_argument("-c", "--cmap", type=str, default="jet", help="matplotlib colormap")
+    parser.add_argument("-x", "--scale", type=int, help="pixels per point, enough for 512 pixels by default")
+    parser.add_argument("-fps", "--fps", type=float, default=DEFAULT_FPS, help="frame rate of a video")
+    parser.add_argument("-j", "--workers", type=int, help="worker processes, one per core by default")
+    args = parser.parse_args(argv)
+
+    import utils as ut
+    from config import DEFAULTS_PATH
+
+    path = args.recording
+    temporary = path is None
+    try:
+        if temporary:
+            if args.steps is None and args.duration is None:
+                parser.error("a headless run needs -n or -T")
+            params = ut.get_default_params(DEFAULTS_PATH)
+            for key, val in vars(args).items():
+                if val is not None and key in params:
+                    params[key] = val
+            path = record_headless(params, args.steps, args.duration, args.every, args.seed)
+        start = time.perf_counter()
+        frames = export(path, args.output, args.vmin, args.vmax, args.cmap, args.scale, args.fps, args.workers)
+        wall = time.perf_counter() - start
+    except (InputError, OSError) as e:
+        print("[WARN]", e)
+        sys.exit(2)
+    except InitializationError as e:
+        print("[FATAL]", e)
+        sys.exit(1)
+    finally:
+        if temporary and path is not None:
+            os.remove(path)
+    print(f"Exported {frames} frames to {args.output} in {round(wall, 2)}s ({round(frames / wall, 1) if wall > 0 else 'inf'} frames/s)")
+
+
+if __name__ == "__main__":
+    main()
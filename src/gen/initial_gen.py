@@ -1,79 +1,71 @@
 import numpy as np
-import random
-import matplotlib.pyplot as plt
-from backwards_euler import insert_matrix
-from utils import linear_norm, normalize, poly
-
-
-def poly_map(points, new_min, new_max):
-    degree_x = random.randint(0, points)
-    coefficients_x = [
-        np.random.randint(-points, points) for _ in range(0, degree_x + 1)
-    ]
-    degree_y = random.randint(0, points)
-    coefficients_y = [
-        np.random.randint(-points, points) for _ in range(0, degree_y + 1)
-    ]
-    hmap = np.array(
-        [
-            [
-                poly(coefficients_x, x) + poly(coefficients_y, y)
-                for x in range(0, points)
-            ]
-            for y in range(0, points)
-        ],
-        dtype=float
-    )
-    return normalize(hmap, new_min, new_max)
-
-
-def constant_map(points, new_min, new_max):
-    return np.full((points, points), np.random.randint(new_min, new_max), dtype=float)
-
-
-def piecewise_poly_map(points, new_min, new_max):
-    midpoint = int(points / 2)
+from gen.utils import normalize, scaled_poly
+
+
+def poly_grid(rows, cols, degree_range, rng):
+    degree_x = rng.integers(0, degree_range + 1)
+    coefficients_x = rng.integers(-degree_range, degree_range, degree_x + 1)
+    degree_y = rng.integers(0, degree_range + 1)
+    coefficients_y = rng.integers(-degree_range, degree_range, degree_y + 1)
+    # A common scale for both axes keeps the sum proportional to the unscaled polynomials
+    degree = max(degree_x, degree_y)
+    scale = max(rows, cols, 1)
+    x = scaled_poly(coefficients_x, np.arange(cols), scale, degree)
+    y = scaled_poly(coefficients_y, np.arange(rows), scale, degree)
+    return y[:, None] + x[None, :]
+
+
+def poly_map(points, new_min, new_max, rng=None):
+    rng = np.random.default_rng(rng)
+    return normalize(poly_grid(points, points, points, rng), new_min, new_max)
+
+
+def constant_map(points, new_min, new_max, rng=None):
+    rng = np.random.default_rng(rng)
+    return np.full((points, points), rng.integers(new_min, new_max), dtype=float)
+
+
+def quadrants(points):
+    # Quadrant slices; for odd points the second half is one row/column larger
+    midpoint = points // 2
+    halves = (slice(0, midpoint), slice(midpoint, points))
+    return [(rows, cols) for rows in halves for cols in halves]
+
+
+def piecewise_poly_map(points, new_min, new_max, rng=None):
+    rng = np.random.default_rng(rng)
     hmap = np.zeros((points, points), dtype=float)
-    tl = poly_map(midpoint, new_min, new_max)
-    hmap = insert_matrix(tl, hmap, 0, 0)
-    tr = poly_map(midpoint, new_min, new_max)
-    hmap = insert_matrix(tr, hmap, 0, midpoint)
-    bl = poly_map(midpoint, new_min, new_max)
-    hmap = insert_matrix(bl, hmap, midpoint, 0)
-    br = poly_map(midpoint, new_min, new_max)
-    hmap = insert_matrix(br, hmap, midpoint, midpoint)
+    for rows, cols in quadrants(points):
+        quadrant = hmap[rows, cols]
+        grid = poly_grid(*quadrant.shape, points // 2, rng)
+        quadrant[...] = normalize(grid, new_min, new_max)
     return hmap
 
 
-def piecewise_map(points, new_min, new_max):
-    midpoint = int(points / 2)
-    hmap = np.zeros((points, points))
-    tl = constant_map(midpoint, new_min, new_max)
-    hmap = insert_matrix(tl, hmap, 0, 0)
-    tr = constant_map(midpoint, new_min, new_max)
-    hmap = insert_matrix(tr, hmap, 0, midpoint)
-    bl = constant_map(midpoint, new_min, new_max)
-    hmap = insert_matrix(bl, hmap, midpoint, 0)
-    br = constant_map(midpoint, new_min, new_max)
-    hmap = insert_matrix(br, hmap, midpoint, midpoint)
+def piecewise_map(points, new_min, new_max, rng=None):
+    rng = np.random.default_rng(rng)
+    hmap = np.zeros((points, points), dtype=float)
+    for rows, cols in quadrants(points):
+        hmap[rows, cols] = rng.integers(new_min, new_max)
     return hmap
 
 
-def border_map(points, new_min, new_max):
-    inner_temp = np.random.randint(new_min, new_min + (new_max - new_min)/4)
+def border_map(points, new_min, new_max, rng=None):
+    rng = np.random.default_rng(rng)
+    quarter = (new_max - new_min) / 4
+    inner_temp = rng.integers(new_min, int(new_min + quarter))
     hmap = np.full((points, points), inner_temp, dtype=float)
-    outer_temp = np.random.randint(new_max - (new_max - new_min)/4, new_max)
-    hmap[0, :] = outer_temp
-    outer_temp = np.random.randint(new_max - (new_max - new_min)/4, new_max)
-    hmap[:, 0] = outer_temp
-    outer_temp = np.random.randint(new_max - (new_max - new_min)/4, new_max)
-    hmap[-1, :] = outer_temp
-    outer_temp = np.random.randint(new_max - (new_max - new_min)/4, new_max)
-    hmap[:, -1] = outer_temp
+    outer_temps = rng.integers(int(new_max - quarter), new_max, 4)
+    hmap[0, :] = outer_temps[0]
+    hmap[:, 0] = outer_temps[1]
+    hmap[-1, :] = outer_temps[2]
+    hmap[:, -1] = outer_temps[3]
     return hmap
 
 
 def main():
+    import matplotlib.pyplot as plt
+
     points = 100
     hmap = piecewise_poly_map(points, 273, 1000)
     fig, axis = plt.subplots()
@@ -1,5 +1,9 @@
+import numpy as np
+from numpy.polynomial import polynomial as P
+
+
 def sigmoid(x):
-    return 1 / (1 + e ** (-x))
+    return 1 / (1 + np.exp(-x))
 
 
 def linear_norm(old_min, old_max, new_min, new_max, x):
@@ -9,14 +13,15 @@ def linear_norm(old_min, old_max, new_min, new_max, x):
 
 
 def normalize(hmap, new_min, new_max):
-    n = len(hmap)
-    old_min = hmap.min()
-    old_max = hmap.max()
-    for x in range(0, n):
-        for y in range(0, n):
-            hmap[x, y] = linear_norm(old_min, old_max, new_min, new_max, hmap[x, y])
-    return hmap
+    return linear_norm(hmap.min(), hmap.max(), new_min, new_max, hmap)
 
 
 def poly(coefficients, x):
-    return sum(coefficient * x**n for n, coefficient in enumerate(coefficients))
+    return P.polyval(x, coefficients)
+
+
+def scaled_poly(coefficients, x, scale, degree):
+    # poly(coefficients, x) / scale^degree, evaluated on x / scale so that high degrees
+    # neither overflow nor lose the lower order terms before normalization
+    n = np.arange(len(coefficients))
+    return P.polyval(x / scale, np.asarray(coefficients, dtype=float) * float(scale) ** (n - degree))
@@ -0,0 +1,238 @@
+import hashlib
+import numpy as np
+import backwards_euler
+from backwards_euler import EdgeCoefficients, gen_boundary_vector
+from exceptions import ParameterError, JsonFileError
+import utils as ut
+from config import MATERIALS_PATH
+from solvers import get_solver
+from gen.initial_gen import quadrants
+
+# Integrators that handle a conductivity varying across the plate. ADI relies on one
+# coefficient everywhere and FTCS on one stable step size
+LAYOUT_INTEGRATORS = ("euler", "cn")
+
+
+def load_material(material):
+    # Density, specific heat and diffusivity of a material in materials.json, all of which are
+    # computed when the file is first read
+    try:
+        materials = ut.load_materials(MATERIALS_PATH)
+    except JsonFileError:
+        raise
+
+    try:
+        return materials[material]
+    except KeyError:
+        raise ParameterError(f'could not get properties for "{material}".')
+
+
+def is_layout(material):
+    # Several comma-separated materials are laid out over the quadrants of the plate
+    return "," in material
+
+
+def describe(material):
+    names = [name.strip().capitalize() for name in material.split(",")]
+    if len(names) == 1:
+        return names[0]
+    return f"{'/'.join(names)} quadrants"
+
+
+def quadrant_mask(points, count):
+    # Material index of every cell, the same quadrants as piecewise_map and cycling through
+    # the materials, so two of them split the plate into left and right halves
+    mask = np.zeros((points, points), dtype=np.intp)
+    for i, (rows, cols) in enumerate(quadrants(points)):
+        mask[rows, cols] = i % count
+    return mask
+
+
+def face_conductivities(k):
+    # Harmonic means of the conductivities either side of every face, which keep the heat flux
+    # continuous where two materials meet. Returned as the west, east, south and north faces of
+    # every interior cell
+    across = 2 * k[1:-1, :-1] * k[1:-1, 1:] / (k[1:-1, :-1] + k[1:-1, 1:])
+    along = 2 * k[:-1, 1:-1] * k[1:, 1:-1] / (k[:-1, 1:-1] + k[1:, 1:-1])
+    return across[:, :-1], across[:, 1:], along[:-1], along[1:]
+
+
+def gen_variable_matrix(faces, scale, shift, dtype=float):
+    # shift * I + diag(scale) * L for the n^2 interior points, with L the five-point Laplacian
+    # weighted by the face conductivities. Every diagonal is computed at once and handed to
+    # the sparse constructor, so nothing is assembled entry by entry
+    import scipy.sparse as spr
+
+    west, east, south, north = faces
+    n = len(west)
+    main = (west + east + south + north).ravel() * scale + shift
+    # Couplings to the next point in the row and in the column; the last point of a row has
+    # no neighbour to its right
+    right = east.copy()
+    right[:, -1] = 0
+    right = right.ravel()[:-1]
+    up = north[:-1].ravel()
+    diagonals = [-scale[n:] * up, -scale[1:] * right, main, -scale[:-1] * right, -scale[:-n] * up]
+    return spr.diags(diagonals, [-n, -1, 0, 1, n], shape=(n * n, n * n), format="csc", dtype=dtype)
+
+
+class MaterialLayout:
+    # Per-cell properties of a plate made of several materials. The matrix of a step at
+    # coeff = dt / dr^2 is I + coeff * diag(1 / ρc) * L, which keeps Σ ρc * T over the interior
+    # changing by exactly the heat conducted through the borders
+    def __init__(self, names, mask):
+        properties = np.array([load_material(name) for name in names], dtype=float)
+        p, c, diffusivity = properties.T
+        self.names = names
+        self.mask = mask
+        self.p = p[mask]
+        self.c = c[mask]
+        self.capacity = self.p * self.c
+        self.k = (diffusivity * p * c)[mask]
+        # The slowest material bounds how quickly the plate settles
+        self.diffusivity = diffusivity[np.unique(mask)].min()
+        self.faces = face_conductivities(self.k)
+        # Factorizations are cached by the properties and where they are, not by the names
+        self.key = (properties.tobytes(), hashlib.sha1(np.ascontiguousarray(mask)).hexdigest())
+
+    def matrix(self, coeff, dtype=float):
+        scale = coeff / self.capacity[1:-1, 1:-1].ravel()
+        return gen_variable_matrix(self.faces, scale, 1.0, dtype)
+
+    def border_conductivities(self):
+        west, east, south, north = self.faces
+        return EdgeCoefficients(south[0], north[-1], west[:, 0], east[:, -1])
+
+    def edge_coefficients(self, coeff):
+        # Coefficient of each border temperature in the right hand side of the cell next to it
+        scale = coeff / self.capacity[1:-1, 1:-1]
+        bottom, top, left, right = self.border_conductivities()
+        return EdgeCoefficients(scale[0] * bottom, scale[-1] * top, scale[:, 0] * left, scale[:, -1] * right)
+
+    def interior_heat(self, temps):
+        # Σ ρc * T over the interior, in double precision
+        return (self.capacity[1:-1, 1:-1] * temps[1:-1, 1:-1]).sum(dtype=float)
+
+    def border_flux(self, temps):
+        # Σ k * (border - adjacent interior temperature) over the border faces
+        west, east, south, north = self.faces
+        return (
+            (south[0] * (temps[0, 1:-1] - temps[1, 1:-1])).sum(dtype=float)
+            + (north[-1] * (temps[-1, 1:-1] - temps[-2, 1:-1])).sum(dtype=float)
+            + (west[:, 0] * (temps[1:-1, 0] - temps[1:-1, 1])).sum(dtype=float)
+            + (east[:, -1] * (temps[1:-1, -1] - temps[1:-1, -2])).sum(dtype=float)
+        )
+
+    def steady_state(self, temps):
+        # The interior solving div(k grad T) = 0 for the current borders, one sparse solve
+        import scipy.sparse.linalg as spl
+
+        n = temps.shape[-1] - 2
+        operator = gen_variable_matrix(self.faces, np.ones(n * n), 0.0)
+        rhs = gen_boundary_vector(temps.astype(float, copy=False), self.border_conductivities())
+        steady = temps.copy()
+        steady[1:-1, 1:-1] = spl.spsolve(operator, rhs.ravel()).reshape(n, n)
+        return steady
+
+
+def gen_layout(material, points):
+    names = [name.strip() for name in material.split(",")]
+    if len(names) > 4:
+        raise ParameterError(f"a plate has four quadrants, not {len(names)}.")
+    return MaterialLayout(names, quadrant_mask(points, len(names)))
+
+
+def load_properties(material, points):
+    # Density, specific heat, diffusivity and layout (None for a single material). The density
+    # and specific heat of a layout are per cell and its diffusivity that of its slowest material
+    if not is_layout(material):
+        return (*load_material(material), None)
+    layout = gen_layout(material, points)
+    return layout.p, layout.c, layout.diffusivity, layout
+
+
+def check_layout(material, integrator, solver):
+    # The integrators and solvers a plate of several materials can use, checked when they are
+    # requested rather than when the solver is built
+    if not is_layout(material):
+        return
+    if integrator not in LAYOUT_INTEGRATORS + ("auto",):
+        raise ParameterError(f"plates of several materials support the {' and '.join(LAYOUT_INTEGRATORS)} integrators, not {integrator}.")
+    if solver != "lu":
+        raise ParameterError(f"plates of several materials need the lu solver, not {solver}.")
+
+
+def gen_engine(integrator, solver, layout, temps, coeff, tolerance, cached=True):
+    # Solve and step engine of a plate with a layout, for a step at coeff = dt / dr^2
+    if integrator not in LAYOUT_INTEGRATORS:
+        raise ParameterError(f"plates of several materials support the {' and '.join(LAYOUT_INTEGRATORS)} integrators, not {integrator}.")
+    points = temps.shape[-1]
+    match integrator:
+        case "euler":
+            solve = get_solver(solver, points, coeff, tolerance, temps.dtype, layout, cached)
+            return solve, backwards_euler.StepEngine(solve, temps, layout.edge_coefficients(coeff))
+        case "cn":
+            solve = get_solver(solver, points, coeff / 2, tolerance, temps.dtype, layout, cached)
+            return solve, StepEngine(solve, layout, temps, coeff / 2)
+
+
+class StepEngine:
+    # Crank-Nicolson on a plate with a layout, for solve inverting I + M / 2. The explicit half
+    # of the step, (I - M / 2) u, is the face-weighted stencil applied in place from per-cell
+    # weights, so a step writes only into buffers allocated here. The borders contribute half
+    # from the start of the step and half from its end, as in crank_nicolson
+    def __init__(self, solve_matrix, layout, temps, coeff):
+        # coeff is that of the half step, dt / (2 dr^2)
+        n = temps.shape[-1] - 2
+        dtype = temps.dtype
+        west, east, south, north = layout.faces
+        scale = coeff / layout.capacity[1:-1, 1:-1]
+        self.solve = solve_matrix
+        self.edges = layout.edge_coefficients(coeff)
+        self.centre = (1 - scale * (west + east + south + north)).astype(dtype)
+        # Weights of the interior neighbours only, zero where the neighbour is a border (which
+        # comes in through the boundary) so the flat shifts in explicit never wrap between rows
+        self.west = (scale * west).astype(dtype)
+        self.west[:, 0] = 0
+        self.east = (scale * east).astype(dtype)
+        self.east[:, -1] = 0
+        self.south = (scale * south).astype(dtype)
+        self.south[0] = 0
+        self.north = (scale * north).astype(dtype)
+        self.north[-1] = 0
+        self.start_boundary = gen_boundary_vector(temps, self.edges)
+        self.end_boundary = self.start_boundary.copy()
+        self.boundary = self.start_boundary + self.end_boundary
+        self.known = np.empty((n, n), dtype=dtype)
+        self.known_vec = self.known.reshape(-1)
+        self.inner = np.empty((n, n), dtype=dtype)
+        self.term = np.empty((n, n), dtype=dtype)
+
+    def set_boundary(self, temps, restart=False):
+        if restart:
+            backwards_euler.update_boundary_vector(self.end_boundary, temps, self.edges)
+        self.start_boundary, self.end_boundary = self.end_boundary, self.start_boundary
+        backwards_euler.update_boundary_vector(self.end_boundary, temps, self.edges)
+        np.add(self.start_boundary, self.end_boundary, out=self.boundary)
+
+    def explicit(self, u, known):
+        # Only flat, contiguous views, as in backwards_euler.neighbour_sum
+        n = u.shape[1]
+        u = u.reshape(-1)
+        known = known.reshape(-1)
+        term = self.term.reshape(-1)
+        np.multiply(u, self.centre.reshape(-1), out=known)
+        for weights, shift in ((self.west, 1), (self.south, n)):
+            np.multiply(u[:-shift], weights.reshape(-1)[shift:], out=term[shift:])
+            known[shift:] += term[shift:]
+        for weights, shift in ((self.east, 1), (self.north, n)):
+            np.multiply(u[shift:], weights.reshape(-1)[:-shift], out=term[:-shift])
+            known[:-shift] += term[:-shift]
+
+    def __call__(self, temps):
+        inner_points = temps[1:-1, 1:-1]
+        np.copyto(self.inner, inner_points)
+        self.explicit(self.inner, self.known)
+        self.known += self.boundary
+        inner_points[...] = self.solve(self.known_vec).reshape(self.known.shape)
+        return temps
@@ -0,0 +1,73 @@
+import numpy as np
+from backwards_euler import gen_coeff_matrix
+
+COARSEST_POINTS = 15
+SWEEPS = 2
+OMEGA = 0.8
+
+
+def apply_operator(u, coeff):
+    # Matrix-free (1 + 4c)u - c * (sum of neighbours) with zero Dirichlet borders
+    out = (1 + 4 * coeff) * u
+    out[1:, :] -= coeff * u[:-1, :]
+    out[:-1, :] -= coeff * u[1:, :]
+    out[:, 1:] -= coeff * u[:, :-1]
+    out[:, :-1] -= coeff * u[:, 1:]
+    return out
+
+
+def interpolate(coarse, n, axis):
+    # Linear interpolation where coarse point i sits on fine point 2i + 1
+    coarse = np.moveaxis(coarse, axis, 0)
+    nc = coarse.shape[0]
+    fine = np.zeros((n,) + coarse.shape[1:])
+    fine[1 : 2 * nc : 2] = coarse
+    fine[0 : 2 * nc : 2] += 0.5 * coarse
+    fine[2 : 2 * nc + 1 : 2] += 0.5 * coarse
+    return np.moveaxis(fine, 0, axis)
+
+
+def restrict_axis(fine, nc, axis):
+    # Transpose of interpolate scaled by 1/2, i.e. full weighting along one axis
+    fine = np.moveaxis(fine, axis, 0)
+    coarse = fine[1 : 2 * nc : 2] + 0.5 * (fine[0 : 2 * nc : 2] + fine[2 : 2 * nc + 1 : 2])
+    return np.moveaxis(0.5 * coarse, 0, axis)
+
+
+def prolong(coarse, n):
+    return interpolate(interpolate(coarse, n, 0), n, 1)
+
+
+def restrict(fine, nc):
+    return restrict_axis(restrict_axis(fine, nc, 0), nc, 1)
+
+
+class Multigrid:
+    def __init__(self, n, coeff):
+        self.levels = []
+        while True:
+            self.levels.append((n, coeff))
+            if n <= COARSEST_POINTS:
+                break
+            n = (n - 1) // 2
+            coeff /= 4
+        n, coeff = self.levels[-1]
+        import scipy.sparse.linalg as spl
+
+        self.coarse_solve = spl.splu(gen_coeff_matrix(n, 1 + 4 * coeff, -coeff)).solve
+
+    def smooth(self, u, b, coeff):
+        diag = 1 + 4 * coeff
+        for _ in range(SWEEPS):
+            u += OMEGA / diag * (b - apply_operator(u, coeff))
+        return u
+
+    def vcycle(self, b, level=0):
+        n, coeff = self.levels[level]
+        if level == len(self.levels) - 1:
+            return self.coarse_solve(b.ravel()).reshape(n, n)
+        u = self.smooth(np.zeros_like(b), b, coeff)
+        nc = self.levels[level + 1][0]
+        residual = restrict(b - apply_operator(u, coeff), nc)
+        u += prolong(self.vcycle(residual, level + 1), n)
+        return self.smooth(u, b, coeff)
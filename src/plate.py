@@ -0,0 +1,176 @@
+from collections import namedtuple
+from time import perf_counter
+import backwards_euler
+import crank_nicolson
+import adi
+import explicit
+import materials
+from exceptions import ParameterError
+from materials import load_properties
+from solvers import get_solver, CG_TOLERANCE
+from profiling import stats
+from boundary import BOUNDARY_TIME
+import gen.initial_gen as gen
+
+
+INTEGRATORS = ("euler", "cn", "adi", "ftcs", "auto")
+PRECISIONS = ("float64", "float32")
+
+# automatic marks a solver whose integrator was picked by estimated cost, so rebuilding it for
+# another dt picks again. layout is the MaterialLayout of a plate of several materials
+BuiltSolver = namedtuple(
+    "BuiltSolver",
+    ["dt", "diffusivity", "integrator", "solver", "coeff", "solve", "engine", "automatic", "layout"],
+    defaults=(False, None),
+)
+
+
+class Plate:
+    def __init__(self, initial_heat_map, points, side_length, solver="lu", tolerance=CG_TOLERANCE, integrator="euler"):
+        self.heat_map = initial_heat_map.copy()
+        self.initial_heat_map = initial_heat_map.copy()
+        self.points = points
+        self.side_length = side_length
+        self.solver = solver
+        self.tolerance = tolerance
+        self.integrator = integrator
+        self.automatic = integrator == "auto"
+        self.dr = side_length / (self.points - 1)
+        self.time = 0.0
+        self.engine = None
+        self.boundary = None
+        self.layout = None
+
+    def build_solver(self, dt, diffusivity=None, integrator=None, solver=None, layout=None, cached=True):
+        # Everything a step at dt needs, built without touching the plate so it can be done in
+        # the background while the current solver keeps stepping. Unset arguments are the plate's,
+        # and a diffusivity without a layout is a plate of a single material. cached=False keeps
+        # a factorization for a one-off dt out of the factor cache
+        if diffusivity is None:
+            diffusivity, layout = self.diffusivity, self.layout
+        integrator = integrator or ("auto" if self.automatic else self.integrator)
+        solver = solver or self.solver
+        coeff = diffusivity * dt / (self.dr**2)
+        dtype = self.heat_map.dtype
+        automatic = integrator == "auto"
+        if layout is not None:
+            # The conductivities are in the layout's matrix, so its coefficient is only dt / dr^2.
+            # Sub-stepping is not costed for varying coefficients, auto always factorizes
+            coeff = dt / (self.dr**2)
+            if automatic:
+                integrator = "euler"
+            start = perf_counter()
+            solve, engine = materials.gen_engine(integrator, solver, layout, self.heat_map, coeff, self.tolerance, cached)
+            stats.record("factorize", perf_counter() - start)
+            return BuiltSolver(dt, diffusivity, integrator, solver, coeff, solve, engine, automatic, layout)
+        if automatic:
+            integrator = explicit.choose_integrator(self.points, coeff, solver)
+        start = perf_counter()
+        match integrator:
+            case "euler":
+                solve = get_solver(solver, self.points, coeff, self.tolerance, dtype, cached=cached)
+                engine = backwards_euler.StepEngine(solve, self.heat_map, coeff)
+            case "cn":
+                solve = get_solver(solver, self.points, coeff / 2, self.tolerance, dtype, cached=cached)
+                engine = crank_nicolson.StepEngine(solve, self.heat_map, coeff)
+            case "adi":
+                solve = adi.gen_banded_matrix(self.points - 2, coeff, dtype)
+                engine = adi.StepEngine(solve, self.heat_map, coeff)
+            case "ftcs":
+                solve = None
+                engine = explicit.StepEngine(self.heat_map, coeff)
+            case _:
+                raise ParameterError(f"unknown integrator {integrator}.")
+        stats.record("factorize", perf_counter() - start)
+        return BuiltSolver(dt, diffusivity, integrator, solver, coeff, solve, engine, automatic)
+
+    def install_solver(self, built):
+        self.dt = built.dt
+        self.diffusivity = built.diffusivity
+        self.integrator = built.integrator
+        self.solver = built.solver
+        self.coeff = built.coeff
+        self.solve = built.solve
+        self.engine = built.engine
+        self.automatic = built.automatic
+        self.layout = built.layout
+        if self.boundary is not None:
+            # Built from the borders as they were, which a schedule may have moved since
+            self.engine.set_boundary(self.heat_map, restart=True)
+
+    def gen_solver(self, dt):
+        self.install_solver(self.build_solver(dt))
+
+    def gen_material_properties(self, material):
+        # One material, or several comma-separated ones laid out over the quadrants, in which
+        # case p and c are per cell
+        self.p, self.c, self.diffusivity, self.layout = load_properties(material, self.points)
+
+    def set_boundary(self, boundary):
+        # A BoundarySchedule for the edges, or None to hold them where they are
+        self.boundary = boundary
+        if boundary is not None:
+            self.apply_boundary(self.time, restart=True)
+
+    def apply_boundary(self, time, restart=False):
+        self.boundary.apply(self.heat_map, time)
+        if self.engine is not None:
+            self.engine.set_boundary(self.heat_map, restart)
+
+    def scheduled_step(self, time):
+        # One step from time with the edges where the integrator needs them, after which the
+        # heat map's edges are left at their values for the end of the step
+        offset = BOUNDARY_TIME[self.integrator]
+        self.apply_boundary(time + offset * self.dt)
+        self.engine(self.heat_map)
+        if offset != 1:
+            self.boundary.apply(self.heat_map, time + self.dt)
+
+    def update(self):
+        if self.boundary is not None:
+            self.scheduled_step(self.time)
+        else:
+            self.engine(self.heat_map)
+        self.time += self.dt
+
+    def advance(self, steps, observers=()):
+        # Observers (diagnostics, recorders) are told how many steps were taken, in chunks that
+        # end exactly when the next one of them is due
+        if observers:
+            while steps > 0:
+                chunk = min([steps] + [observer.due() for observer in observers])
+                self.advance(chunk)
+                for observer in observers:
+                    observer.stepped(chunk)
+                steps -= chunk
+            return
+        engine = self.engine
+        heat_map = self.heat_map
+        if self.boundary is not None:
+            # Scheduled edges are moved every step, the rest stays as fast as before
+            for i in range(steps):
+                self.scheduled_step(self.time + i * self.dt)
+            self.time += steps * self.dt
+            return
+        for _ in range(steps):
+            engine(heat_map)
+        self.time += steps * self.dt
+
+    def reset(self):
+        self.heat_map = self.initial_heat_map.copy()
+        self.time = 0.0
+        if self.boundary is not None:
+            self.apply_boundary(0.0, restart=True)
+
+
+def gen_plate(points, side_length, function, new_min, new_max, solver="lu", tolerance=CG_TOLERANCE, integrator="euler", seed=None, precision="float64"):
+    # The precision of the initial map is that of everything built for the plate afterwards
+    try:
+        fn = getattr(gen, f"{function}_map")
+    except AttributeError:
+        raise ParameterError(f"unknown function name {function}.")
+    if precision not in PRECISIONS:
+        raise ParameterError(f"unknown precision {precision}.")
+    initial_map = fn(points, new_min, new_max, seed).astype(precision, copy=False)
+    new_plate = Plate(initial_map, points, side_length, solver, tolerance, integrator)
+    return new_plate
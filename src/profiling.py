@@ -0,0 +1,77 @@
+from collections import deque
+from contextlib import nullcontext
+from time import perf_counter
+import numpy as np
+
+LATENCY_HISTORY = 10000
+PERCENTILES = (50, 95, 99)
+PROFILE_PATH = "heatism.prof"
+# Report order and labels of the timed sections
+SECTIONS = {
+    "update": "Step Latency",
+    "factorize": "Factorization",
+    "render": "Render Time",
+    "publish_lock": "Lock Wait (solver)",
+    "take_lock": "Lock Wait (renderer)",
+    "frame_wait": "Frame Wait",
+}
+
+NULL_TIMER = nullcontext()
+
+
+class Timer:
+    def __init__(self, samples):
+        self.samples = samples
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, *exc):
+        self.samples.append(perf_counter() - self.start)
+
+
+class Stats:
+    # Latencies of the hot paths, collected only while enabled. Instrumented code either checks
+    # enabled or goes through timer, which hands back a shared no-op context when it is off, so
+    # a disabled collector costs an attribute lookup per frame rather than per step
+    def __init__(self, history=LATENCY_HISTORY):
+        self.enabled = False
+        self.history = history
+        self.samples = {}
+
+    def series(self, name):
+        if name not in self.samples:
+            self.samples[name] = deque(maxlen=self.history)
+        return self.samples[name]
+
+    def timer(self, name):
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self.series(name))
+
+    def record(self, name, seconds):
+        if self.enabled:
+            self.series(name).append(seconds)
+
+    def reset(self):
+        self.samples.clear()
+
+    def percentiles(self, name):
+        return np.percentile(np.fromiter(self.samples[name], dtype=float), PERCENTILES)
+
+    def report(self):
+        lines = []
+        for name, label in SECTIONS.items():
+            if not self.samples.get(name):
+                continue
+            values = ", ".join(f"p{p} {ms(v)}" for p, v in zip(PERCENTILES, self.percentiles(name)))
+            lines.append(f"{label}: {values} ({len(self.samples[name])} samples)")
+        return "\n".join(lines)
+
+
+def ms(seconds):
+    return f"{round(seconds * 1000, 3)}ms"
+
+
+# Each process collects its own; the REPL combines the solver's report with the renderer's
+stats = Stats()
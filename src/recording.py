@@ -0,0 +1,295 @@
+import argparse
+import json
+import queue
+import struct
+import threading
+import zipfile
+from collections import OrderedDict
+import numpy as np
+from exceptions import ParameterError
+
+MAGIC = b"HEATREC1"
+HEADER_BYTES = 4096
+RECORD_BUFFERS = 8
+CHUNK_FRAMES = 64
+COMPRESS_LEVEL = 1
+GROWTH = 2
+CACHED_CHUNKS = 4
+
+
+def frame_dtype(points, dtype):
+    # One record per frame, so the heat maps of a recording are a strided view of the file
+    return np.dtype([("step", np.int64), ("time", np.float64), ("heat_map", dtype, (points, points))])
+
+
+def write_header(f, metadata):
+    header = json.dumps(metadata).encode()
+    if len(MAGIC) + 8 + len(header) > HEADER_BYTES:
+        raise ParameterError(f"recording metadata does not fit in {HEADER_BYTES} bytes.")
+    f.seek(0)
+    f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+
+
+def read_header(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ParameterError(f"{f.name} is not a recording.")
+    (length,) = struct.unpack("<Q", f.read(8))
+    return json.loads(f.read(length))
+
+
+class MemmapWriter:
+    # Frames go straight into a preallocated memory-mapped file, grown geometrically when full
+    def __init__(self, path, metadata, dtype, capacity):
+        self.path = path
+        self.metadata = metadata
+        self.dtype = dtype
+        self.frames = 0
+        with open(path, "wb") as f:
+            write_header(f, dict(metadata, frames=0))
+        self.map(max(1, capacity))
+
+    def map(self, capacity):
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER_BYTES + capacity * self.dtype.itemsize)
+        self.records = np.memmap(self.path, dtype=self.dtype, mode="r+", offset=HEADER_BYTES, shape=(capacity,))
+
+    def write(self, step, time, heat_map):
+        if self.frames == len(self.records):
+            self.records.flush()
+            self.map(GROWTH * len(self.records))
+        record = self.records[self.frames]
+        record["step"] = step
+        record["time"] = time
+        np.copyto(record["heat_map"], heat_map)
+        self.frames += 1
+
+    def close(self):
+        self.records.flush()
+        del self.records
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER_BYTES + self.frames * self.dtype.itemsize)
+            write_header(f, dict(self.metadata, frames=self.frames))
+
+
+class ChunkWriter:
+    # Frames are gathered into chunks that are each stored as a deflated member of a zip file
+    def __init__(self, path, metadata, dtype, chunk_frames=CHUNK_FRAMES):
+        self.metadata = dict(metadata, chunk_frames=chunk_frames)
+        self.archive = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=COMPRESS_LEVEL)
+        self.chunk = np.empty(chunk_frames, dtype=dtype)
+        self.filled = 0
+        self.chunks = 0
+        self.frames = 0
+        # Steps and times of every frame, stored uncompressed at the end as an index
+        self.index = []
+
+    def write(self, step, time, heat_map):
+        self.index.append((step, time))
+        record = self.chunk[self.filled]
+        record["step"] = step
+        record["time"] = time
+        np.copyto(record["heat_map"], heat_map)
+        self.filled += 1
+        self.frames += 1
+        if self.filled == len(self.chunk):
+            self.flush()
+
+    def flush(self):
+        if self.filled == 0:
+            return
+        with self.archive.open(f"chunk_{self.chunks:06d}.npy", "w", force_zip64=True) as f:
+            np.lib.format.write_array(f, self.chunk[: self.filled])
+        self.chunks += 1
+        self.filled = 0
+
+    def close(self):
+        self.flush()
+        index = np.array(self.index, dtype=[("step", np.int64), ("time", np.float64)])
+        with self.archive.open("index.npy", "w") as f:
+            np.lib.format.write_array(f, index)
+        self.archive.writestr("metadata.json", json.dumps(dict(self.metadata, frames=self.frames)))
+        self.archive.close()
+
+
+class Recorder:
+    # Records every `every`-th heat map of a plate. The stepping thread only copies the map into
+    # a free buffer from a small preallocated pool; a background thread does all of the writing.
+    # When every buffer is still queued the frame is dropped, or if block is set, waited for
+    def __init__(self, path, plate, metadata, every=1, capacity=None, compress=False, buffers=RECORD_BUFFERS, block=True):
+        self.plate = plate
+        self.every = every
+        self.block = block
+        self.steps = 0
+        self.pending = 0
+        self.dropped = 0
+        points = plate.points
+        dtype = frame_dtype(points, plate.heat_map.dtype)
+        metadata = dict(
+            metadata,
+            points=points,
+            side_length=plate.side_length,
+            every=every,
+            dtype=plate.heat_map.dtype.str,
+            format="chunked" if compress else "memmap",
+        )
+        if compress:
+            self.writer = ChunkWriter(path, metadata, dtype)
+        else:
+            self.writer = MemmapWriter(path, metadata, dtype, capacity or CHUNK_FRAMES)
+        self.free = queue.Queue()
+        for _ in range(buffers):
+            self.free.put(np.empty((points, points), dtype=plate.heat_map.dtype))
+        self.queued = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.thread.start()
+        self.capture()
+
+    def write_loop(self):
+        while True:
+            item = self.queued.get()
+            if item is None:
+                break
+            step, time, buffer = item
+            try:
+                if self.error is None:
+                    self.writer.write(step, time, buffer)
+            except Exception as e:
+                # Raised again by close, on the thread that owns the recorder
+                self.error = e
+            self.free.put(buffer)
+        try:
+            self.writer.close()
+        except Exception as e:
+            self.error = self.error or e
+
+    def capture(self):
+        try:
+            buffer = self.free.get(block=self.block)
+        except queue.Empty:
+            self.dropped += 1
+            return
+        np.copyto(buffer, self.plate.heat_map)
+        self.queued.put((self.steps, self.plate.time, buffer))
+
+    def due(self):
+        return self.every - self.pending
+
+    def stepped(self, steps=1):
+        self.steps += steps
+        self.pending += steps
+        if self.pending >= self.every:
+            self.pending = 0
+            self.capture()
+
+    def frames(self):
+        return self.writer.frames
+
+    def close(self):
+        self.queued.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+class Recording:
+    # Reads a recording back. frames of a memmap recording is a view of the file, so indexing,
+    # slicing and reductions only touch the pages they need and nothing is copied into memory.
+    # Chunked recordings decompress a chunk on first access and return views into it
+    def __init__(self, path):
+        self.path = path
+        self.archive = None
+        if zipfile.is_zipfile(path):
+            self.open_chunked(path)
+        else:
+            self.open_memmap(path)
+
+    def open_memmap(self, path):
+        with open(path, "rb") as f:
+            self.metadata = read_header(f)
+        dtype = frame_dtype(self.metadata["points"], np.dtype(self.metadata["dtype"]))
+        frames = self.metadata["frames"]
+        if frames == 0:
+            records = np.empty(0, dtype=dtype)
+        else:
+            records = np.memmap(path, dtype=dtype, mode="r", offset=HEADER_BYTES, shape=(frames,))
+        self.frames = records["heat_map"]
+        self.steps = records["step"]
+        self.times = records["time"]
+
+    def open_chunked(self, path):
+        self.archive = zipfile.ZipFile(path)
+        self.metadata = json.loads(self.archive.read("metadata.json"))
+        with self.archive.open("index.npy") as f:
+            index = np.lib.format.read_array(f)
+        self.frames = None
+        self.steps = index["step"]
+        self.times = index["time"]
+        self.chunks = OrderedDict()
+
+    def chunk(self, number):
+        if number in self.chunks:
+            self.chunks.move_to_end(number)
+            return self.chunks[number]
+        with self.archive.open(f"chunk_{number:06d}.npy") as f:
+            heat_maps = np.lib.format.read_array(f)["heat_map"]
+        self.chunks[number] = heat_maps
+        if len(self.chunks) > CACHED_CHUNKS:
+            self.chunks.popitem(last=False)
+        return heat_maps
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, index):
+        if self.frames is not None:
+            return self.frames[index]
+        if isinstance(index, slice):
+            return np.stack([self[i] for i in range(*index.indices(len(self)))])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"frame {index} out of range for a recording of {len(self)} frames.")
+        chunk_frames = self.metadata["chunk_frames"]
+        return self.chunk(index // chunk_frames)[index % chunk_frames]
+
+    def nearest(self, time):
+        # Index of the frame closest to the given simulated time, for scrubbing
+        return int(np.abs(self.times - time).argmin())
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="simulation.py replay", description="scrub through a recording")
+    parser.add_argument("path", type=str, help="recording to open")
+    args = parser.parse_args(argv)
+
+    import matplotlib.pyplot as plt
+    from matplotlib.widgets import Slider
+
+    recording = Recording(args.path)
+    if len(recording) == 0:
+        print(f"[WARN] {args.path} has no frames.")
+        return
+    metadata = recording.metadata
+    plt.style.use("dark_background")
+    fig, axis = plt.subplots()
+    fig.subplots_adjust(bottom=0.2)
+    pcm = axis.pcolormesh(
+        recording[0], cmap=plt.cm.jet, vmin=metadata.get("min_temp"), vmax=metadata.get("max_temp")
+    )
+    plt.colorbar(pcm, ax=axis)
+    axis.set_title(f"{metadata.get('material', '').capitalize()} t = {recording.times[0]:.2f}s")
+    slider = Slider(fig.add_axes([0.15, 0.05, 0.6, 0.04]), "Frame", 0, len(recording) - 1, valinit=0, valstep=1)
+
+    def scrub(frame):
+        frame = int(frame)
+        pcm.set_array(recording[frame])
+        axis.set_title(f"{metadata.get('material', '').capitalize()} t = {recording.times[frame]:.2f}s")
+        fig.canvas.draw_idle()
+
+    slider.on_changed(scrub)
+    plt.show()
@@ -0,0 +1,208 @@
+import math
+import os
+import tempfile
+import numpy as np
+from time import perf_counter
+from profiling import stats
+
+RATE_WINDOW = 1.0
+DEFAULT_PIXELS = 800
+INFO_BYTES = 1024
+FRAME_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+# Layout of SharedFrames.control
+GENERATION, POINTS, PID, BACK, READY, FRONT, FRESH, VERSION, STRIDE, ITEMSIZE, ROWS = range(11)
+CONTROL_SIZE = ROWS + 6
+
+
+class RateMeter:
+    # Events per second over windows of about RATE_WINDOW seconds
+    def __init__(self):
+        self.count = 0
+        self.start = perf_counter()
+        self.rate = 0.0
+
+    def tick(self, count=1):
+        self.count += count
+        now = perf_counter()
+        elapsed = now - self.start
+        if elapsed >= RATE_WINDOW:
+            self.rate = self.count / elapsed
+            self.count = 0
+            self.start = now
+
+
+class SharedFrames:
+    # Triple buffer of downsampled frames in a memory-mapped file shared between the solver
+    # process and the renderer. The solver writes into the back buffer and swaps it with the
+    # ready one; the renderer swaps the ready one with the front one it draws from. The lock
+    # only covers those index swaps, so neither side ever waits on the other's copy or draw
+    def __init__(self, ctx):
+        self.control = ctx.Array("q", CONTROL_SIZE, lock=False)
+        self.scale = ctx.Array("d", 2, lock=False)
+        self.info = ctx.Array("c", 3 * INFO_BYTES, lock=False)
+        self.lock = ctx.Lock()
+        self.taken = ctx.Event()
+        self.taken.set()
+        self.control[STRIDE] = 1
+        self.pid = None
+        self.generation = 0
+        self.buffers = None
+
+    def path(self, generation):
+        return os.path.join(FRAME_DIR, f"heatism-{self.pid}-{generation}.frames")
+
+    def allocate(self, points, vmin, vmax, dtype=np.float64):
+        # Solver side: new buffers whenever the plate changes size, scale or precision
+        self.pid = os.getpid()
+        self.generation += 1
+        dtype = np.dtype(dtype)
+        buffers = np.memmap(self.path(self.generation), dtype=dtype, mode="w+", shape=(3, points, points))
+        with self.lock:
+            control = self.control
+            control[GENERATION] = self.generation
+            control[POINTS] = points
+            control[ITEMSIZE] = dtype.itemsize
+            control[BACK], control[READY], control[FRONT] = 0, 1, 2
+            control[FRESH] = 0
+            control[PID] = self.pid
+            control[ROWS : ROWS + 6] = [0] * 6
+            self.scale[0], self.scale[1] = vmin, vmax
+        self.release()
+        self.buffers = buffers
+
+    def acquire(self, section):
+        with stats.timer(section):
+            self.lock.acquire()
+
+    def release(self):
+        # The renderer keeps its own mapping, so the file can go as soon as it is replaced
+        if self.buffers is not None:
+            os.remove(self.buffers.filename)
+            self.buffers = None
+
+    def publish(self, heat_map, info):
+        step = self.control[STRIDE]
+        view = heat_map[::step, ::step]
+        back = self.control[BACK]
+        np.copyto(self.buffers[back, : view.shape[0], : view.shape[1]], view)
+        self.control[ROWS + 2 * back] = view.shape[0]
+        self.control[ROWS + 2 * back + 1] = view.shape[1]
+        self.info[back * INFO_BYTES : (back + 1) * INFO_BYTES] = info.encode()[:INFO_BYTES].ljust(INFO_BYTES, b"\0")
+        self.acquire("publish_lock")
+        try:
+            self.control[BACK], self.control[READY] = self.control[READY], back
+            self.control[FRESH] = 1
+            self.control[VERSION] += 1
+        finally:
+            self.lock.release()
+        self.taken.clear()
+
+    def set_stride(self, step):
+        self.control[STRIDE] = step
+
+    def take(self):
+        # Renderer side: (frame, info, whether it is new); frame is None until the first publish
+        generation = self.control[GENERATION]
+        if generation == 0:
+            return None, "", False
+        if generation != self.generation:
+            try:
+                points = self.control[POINTS]
+                dtype = np.dtype(f"f{self.control[ITEMSIZE]}")
+                self.pid = self.control[PID]
+                self.buffers = np.memmap(self.path(generation), dtype=dtype, mode="r", shape=(3, points, points))
+            except FileNotFoundError:
+                # Already replaced by a newer plate, picked up on the next call
+                return None, "", False
+            self.generation = generation
+        self.acquire("take_lock")
+        try:
+            fresh = self.control[FRESH] == 1 and self.control[GENERATION] == self.generation
+            if fresh:
+                self.control[FRONT], self.control[READY] = self.control[READY], self.control[FRONT]
+                self.control[FRESH] = 0
+            front = self.control[FRONT]
+        finally:
+            self.lock.release()
+        self.taken.set()
+        rows = self.control[ROWS + 2 * front]
+        cols = self.control[ROWS + 2 * front + 1]
+        if rows == 0:
+            return None, "", False
+        info = self.info[front * INFO_BYTES : (front + 1) * INFO_BYTES].split(b"\0")[0].decode()
+        return self.buffers[front, :rows, :cols], info, fresh
+
+    def points(self):
+        return self.control[POINTS]
+
+    def limits(self):
+        return self.scale[0], self.scale[1]
+
+
+def stride(points, pixels):
+    # Every stride-th point is shown, so the image is never much larger than the screen area
+    return max(1, math.ceil(points / max(1, pixels)))
+
+
+class Renderer:
+    # imshow of the latest frame with the image and overlay drawn as blitted artists, so a new
+    # frame only redraws those two instead of the whole figure
+    def __init__(self, frame, points, vmin, vmax, info=""):
+        import matplotlib.pyplot as plt
+
+        self.plt = plt
+        plt.style.use("dark_background")
+        self.fig, self.axis = plt.subplots()
+        self.fig.subplots_adjust(right=0.75)
+        self.image = self.axis.imshow(
+            frame,
+            cmap=plt.cm.jet,
+            vmin=vmin,
+            vmax=vmax,
+            origin="lower",
+            interpolation="nearest",
+            # Plate coordinates, whatever the stride of the frames shown
+            extent=(0, points, 0, points),
+            animated=True,
+        )
+        self.bar = plt.colorbar(self.image, ax=self.axis)
+        self.info = self.fig.text(0.78, 0.5, info, va="center", ha="left", family="monospace", animated=True)
+        self.fps = RateMeter()
+        self.background = None
+        self.fig.canvas.mpl_connect("draw_event", self.on_draw)
+        plt.show(block=False)
+        self.fig.canvas.draw()
+
+    def pixels(self):
+        # Width of the axis on screen in pixels, which bounds the useful image resolution
+        width = self.axis.get_window_extent().width
+        return int(width) if width > 0 else DEFAULT_PIXELS
+
+    def on_draw(self, event):
+        # Full redraws (first show, resizes) refresh the background the blits are drawn over
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        self.axis.draw_artist(self.image)
+        self.fig.draw_artist(self.info)
+
+    def draw(self, frame, info):
+        self.image.set_data(frame)
+        self.fps.tick()
+        self.info.set_text(f"{info}\nFPS: {round(self.fps.rate, 1)}")
+        canvas = self.fig.canvas
+        if self.background is None:
+            canvas.draw()
+            return
+        canvas.restore_region(self.background)
+        self.draw_artists()
+        canvas.blit(self.fig.bbox)
+
+    def wait(self, interval):
+        # Runs the GUI event loop without the full redraw plt.pause would do
+        self.fig.canvas.flush_events()
+        self.fig.canvas.start_event_loop(interval)
+
+    def close(self):
+        self.plt.close(self.fig)
@@ -0,0 +1,66 @@
+import math
+
+SMOOTHING = 0.2
+MAX_STEPS_PER_FRAME = 10000
+
+
+class FrameScheduler:
+    # Picks how many steps to advance between redraws. A fixed steps_per_frame is used unless a
+    # target FPS (render budget) or a simulated-seconds-per-wall-second rate is set
+    def __init__(self, steps_per_frame=1, target_fps=0, sim_rate=0):
+        self.steps_per_frame = steps_per_frame
+        self.target_fps = target_fps
+        self.sim_rate = sim_rate
+        self.step_cost = None
+        self.overhead = None
+        self.frame_time = None
+        self.sim_debt = 0.0
+        self.last_steps = 0
+
+    def mode(self):
+        if self.sim_rate and self.target_fps:
+            return f"{self.sim_rate}x real time at {self.target_fps} FPS"
+        if self.sim_rate:
+            return f"{self.sim_rate}x real time"
+        if self.target_fps:
+            return f"{self.target_fps} FPS"
+        return "fixed"
+
+    def budget_steps(self):
+        # Steps that fit in one frame after the measured render/pause overhead
+        if self.step_cost is None or self.overhead is None:
+            return 1
+        spare = 1 / self.target_fps - self.overhead
+        return max(1, math.floor(spare / self.step_cost))
+
+    def steps(self, dt):
+        if not self.sim_rate and not self.target_fps:
+            return self.steps_per_frame
+        if self.sim_rate:
+            if self.frame_time is not None:
+                self.sim_debt += self.sim_rate * self.frame_time
+            k = math.floor(self.sim_debt / dt)
+            if self.target_fps:
+                k = min(k, self.budget_steps())
+            k = min(k, MAX_STEPS_PER_FRAME)
+            self.sim_debt = min(self.sim_debt - k * dt, dt * MAX_STEPS_PER_FRAME)
+            return k
+        return min(self.budget_steps(), MAX_STEPS_PER_FRAME)
+
+    def record(self, steps, step_time, frame_time):
+        self.last_steps = steps
+        self.frame_time = frame_time
+        overhead = frame_time - step_time
+        self.overhead = smooth(self.overhead, overhead)
+        if steps > 0:
+            self.step_cost = smooth(self.step_cost, step_time / steps)
+
+    def reset(self):
+        self.step_cost = None
+        self.sim_debt = 0.0
+
+
+def smooth(average, sample):
+    if average is None:
+        return sample
+    return (1 - SMOOTHING) * average + SMOOTHING * sample
@@ -1,12 +1,6 @@
-import matplotlib.pyplot as plt
 import numpy as np
-import random, json, sys, threading, os, argparse
-from backwards_euler import (
-    insert_matrix,
-    gen_coeff_matrix,
-    gen_known_vector,
-    next_temps,
-)
+import random, json, sys, threading, os, argparse, multiprocessing, queue, cProfile
+from concurrent.futures import ThreadPoolExecutor
 from exceptions import (
     InputError,
     UninitializedError,
@@ -15,67 +9,20 @@ from exceptions import (
     InitializationError,
     JsonFileError
 )
-import scipy.sparse as spr
-import scipy.sparse.linalg as spl
 import utils as ut
-from time import sleep
-from pathlib import Path
-import gen.initial_gen as gen
-
-base_dir = Path(__file__).parent
-config_dir = base_dir.parent / "configs"
-gen_dir = base_dir / "gen"
-
-DEFAULTS_PATH = config_dir / "defaults.json"
-MATERIALS_PATH = config_dir / "materials.json"
-FUNCTIONS_PATH = gen_dir / "functions.json"
-
-
-class Plate:
-    def __init__(self, initial_heat_map, points, side_length):
-        self.heat_map = initial_heat_map.copy()
-        self.initial_heat_map = initial_heat_map.copy()
-        self.points = points
-        self.side_length = side_length
-        self.dr = side_length / (self.points - 1)
-
-    def gen_solver(self, dt):
-        self.coeff = self.diffusivity * dt / (self.dr**2)
-        coeff_matrix = gen_coeff_matrix(
-            self.points - 2, 1 + 4 * self.coeff, -self.coeff
-        )
-        coeff_matrix = spr.csc_matrix(coeff_matrix)
-        self.solve = spl.factorized(coeff_matrix)
-
-    def gen_material_properties(self, material):
-        try:
-            material_dict = ut.load_json(MATERIALS_PATH) 
-        except JsonFileError:
-            raise 
-
-        try:
-            properties = material_dict[material]
-        except KeyError:
-            raise ParameterError(f'could not get properties for "{material}".')
-
-        try:
-            k = properties["k"]
-            p = properties["p"]
-            c = properties["c"]
-        except Exception as e:
-            raise JsonFileError(f"could not decode material properties: {e}.")
-        self.c = c
-        self.p = p
-        self.diffusivity = k / (p * c)
-
-    def update(self):
-        t = gen_known_vector(self.heat_map, self.coeff)
-        new_temps_vec = self.solve(t)
-        new_temps_matrix = new_temps_vec.reshape(self.points - 2, self.points - 2)
-        self.heat_map = insert_matrix(new_temps_matrix, self.heat_map, 1, 1)
-
-    def reset(self):
-        self.heat_map = self.initial_heat_map.copy()
+from plate import gen_plate, INTEGRATORS
+from materials import load_properties, describe, check_layout
+from adaptive import AdaptiveStepper
+from solvers import factor_cache, SOLVERS, CGSolver
+from config import DEFAULTS_PATH, MATERIALS_PATH, FUNCTIONS_PATH
+from scheduler import FrameScheduler
+from render import SharedFrames, RateMeter, Renderer, stride
+from diagnostics import Diagnostics, DIAGNOSTICS_EVERY
+from recording import Recorder
+from steady import steady_state, steps_to_equilibrium, time_constant, EQUILIBRIUM_TOLERANCE
+from profiling import stats, PROFILE_PATH
+from boundary import load_boundary
+from time import sleep, perf_counter
 
 
 def param_property(param):
@@ -94,85 +41,319 @@ class SimState:
         for param in defaults_dict.keys():
             setattr(cls, param, param_property(param))
 
-    def __init__(self):
+    def __init__(self, frames=None):
         self.running = False
         self.render_changes = False
-        self.regen_plot = False
         self.params = {}
-
-    def print_info(self):
-        average_temp = self.plate.heat_map.mean().round(2)
+        self.stepper = None
+        self.scheduler = FrameScheduler()
+        self.diagnostics = None
+        self.diagnostics_every = DIAGNOSTICS_EVERY
+        self.recorder = None
+        self.frames = frames
+        self.frame_layout = None
+        self.steps_meter = RateMeter()
+        # Solvers for new parameters are built here while the current one keeps stepping
+        self.factorizer = ThreadPoolExecutor(max_workers=1)
+        self.pending = None
+        self.boundary_path = None
+        self.profiler = None
+        self.profile_steps = 0
+        self.profile_path = None
+
+    def info(self):
+        sample = self.diagnostics.latest()
+        average_temp = sample.mean.round(2)
         thickness = self.thickness
-        dt = self.dt
-        material = self.material.capitalize()
-        energy_info = ut.total_energy(
-            self.plate.p,
-            self.plate.c,
-            self.plate.heat_map,
-            self.plate.dr**2 * thickness,
-        )
+        dt = f"{self.plate.dt}s"
+        if self.stepper is not None:
+            dt = f"{self.stepper.dt}s (adaptive, base {self.dt}s, tolerance {self.stepper.tolerance}K)"
+        sim_time = round(self.plate.time, 2)
+        energy_info = ut.convert_energy(sample.energy)
         thermal_energy = energy_info[0].round(2)
         energy_units = energy_info[1]
-        print(
-            f"""
-Material: {material}
+        imbalance = ut.convert_energy(abs(sample.imbalance))
+        balance_info = f"{imbalance[0].round(2)}{imbalance[1]} ({self.diagnostics.relative_imbalance():.2e} of exchanged heat)"
+        cache_size = round(factor_cache.size / 1024**2, 2)
+        solver_info = f"Solver Cache: {len(factor_cache.entries)} factorizations, {cache_size}MB ({factor_cache.hits} hits, {factor_cache.misses} misses)"
+        integrator = self.plate.integrator.upper()
+        if self.plate.automatic:
+            integrator += " (picked by cost)"
+        if self.plate.integrator == "adi":
+            solver_info = "Solver Cache: unused by ADI"
+        elif self.plate.integrator == "ftcs":
+            engine = self.plate.engine
+            solver_info = f"Explicit Sub-steps: {engine.substeps} per step of {round(engine.r, 4)} each, on {len(engine.tiles)} row tiles"
+        elif self.plate.solver == "cg":
+            solver_info = f"CG Tolerance: {self.plate.tolerance}\nCG Iterations: {self.plate.solve.iterations} (residual {self.plate.solve.residual:.2e})"
+        if self.boundary_path is not None:
+            solver_info += f"\nBoundary Schedule: {', '.join(self.plate.boundary.edges)} from {self.boundary_path}"
+        if self.pending is not None:
+            solver_info += f"\nPending Solver: {self.integrator.upper()} {self.solver.upper()} at {self.dt}s for {self.material}, building in the background"
+        return f"""
+Material: {describe(self.plate_material)}
 Side Length: {self.plate.side_length}m
 Thickness: {thickness}m
 Points: {self.plate.points}x{self.plate.points}
-Time Step: {dt}s
-Average Temperature: {average_temp}K
-Total Thermal Energy: {thermal_energy}{energy_units}
+Precision: {self.plate.heat_map.dtype}
+Time Step: {dt}
+Simulated Time: {sim_time}s
+Steps Per Frame: {self.scheduler.last_steps} ({self.scheduler.mode()})
+Integrator: {integrator}
+Solver: {self.plate.solver.upper()}
+Average Interior Temperature: {average_temp}K
+Interior Temperature Range: {sample.min.round(2)}K to {sample.max.round(2)}K
+Interior Thermal Energy: {thermal_energy}{energy_units}
+Boundary Heat Flow: {round(sample.flux, 2)}W
+Energy Balance Error: {balance_info}
+Diagnostics: every {self.diagnostics.every} steps, last at step {sample.step} ({round(sample.time, 2)}s)
+{solver_info}
         """
-        )
+
+    def steady(self, epsilon=EQUILIBRIUM_TOLERANCE, apply=False):
+        start = perf_counter()
+        steady = steady_state(self.plate.heat_map, self.plate.layout)
+        solve_time = perf_counter() - start
+        dt = self.current_dt()
+        steps = steps_to_equilibrium(self.plate, epsilon, steady, dt)
+        energy_info = ut.total_energy(self.plate.p, self.plate.c, steady, self.plate.dr**2 * self.thickness)
+        if apply:
+            np.copyto(self.plate.heat_map, steady)
+            self.plate.time += steps * dt
+            self.reset_diagnostics()
+            self.render_changes = True
+        return f"""
+Steady Average Temperature: {steady.mean().round(2)}K
+Steady Temperature Range: {steady.min().round(2)}K to {steady.max().round(2)}K
+Steady Thermal Energy: {energy_info[0].round(2)}{energy_info[1]}
+Steps To Within {epsilon}K: {steps} at {dt}s ({round(steps * dt, 2)}s simulated)
+Slowest Mode Time Constant: {round(time_constant(self.plate), 2)}s
+Solve Time: {round(solve_time, 4)}s
+        """
+
+    def stats(self):
+        lines = [stats.report()]
+        lu_bytes = factor_cache.solve_bytes(self.plate.solve)
+        if lu_bytes:
+            lines.append(f"LU Factors: {round(lu_bytes / 1024**2, 2)}MB for this plate, {round(factor_cache.size / 1024**2, 2)}MB cached")
+        if self.profiler is not None:
+            lines.append(f"Profiling: {self.profile_steps} steps left, writing to {self.profile_path}")
+        return "\n".join(line for line in lines if line)
+
+    def enable_stats(self, enabled):
+        stats.enabled = enabled
+
+    def reset_stats(self):
+        stats.reset()
+
+    def start_profile(self, steps, path=PROFILE_PATH):
+        self.profiler = cProfile.Profile()
+        self.profile_steps = steps
+        self.profile_path = path
+        return f"Profiling the next {steps} steps into {path}."
+
+    def publish(self):
+        layout = (self.plate.points, self.min_temp, self.max_temp, self.plate.heat_map.dtype)
+        if layout != self.frame_layout:
+            self.frames.allocate(*layout)
+            self.frame_layout = layout
+        self.frames.publish(self.plate.heat_map, generate_plot_info(self))
 
     def reset_flags(self):
         self.running = False
         self.render_changes = False
-        self.regen_plot = False
 
-    def update_plate(self):
+    def new_plate(self, options, use_defaults=False, seed=None):
+        self.reset_flags()
+        if not self.params or use_defaults:
+            defaults = ut.get_default_params(DEFAULTS_PATH)
+            self.add_default_attributes(defaults)
+            self.params = defaults
+        if not use_defaults:
+            for key, val in options.items():
+                if val and key in self.params:
+                    self.params[key] = val
+        self.update_plate(seed)
+
+    def update_plate(self, seed=None):
         material = self.material
         points = self.points
         side_length = self.side_length
         function = self.function
         dt = self.dt
+        solver = self.solver
+        tolerance = self.tolerance
+        integrator = self.integrator
         new_min = self.min_temp
         new_max = self.max_temp
+        precision = self.precision
         try:
-            new_plate = gen_plate(points, side_length, function, new_min, new_max)
+            new_plate = gen_plate(points, side_length, function, new_min, new_max, solver, tolerance, integrator, seed, precision)
         except InputError:
             raise
-        self.plate = new_plate
         try:
-            self.plate.gen_material_properties(material)
+            new_plate.gen_material_properties(material)
+            new_plate.gen_solver(dt)
+            if self.boundary_path is not None:
+                new_plate.set_boundary(load_boundary(self.boundary_path, points))
         except InitializationError:
             raise
         except InputError:
             raise
-        self.plate.gen_solver(dt)
+        self.stop_recording()
+        self.plate = new_plate
+        self.plate_material = material
+        self.pending = None
+        self.reset_stepper()
+        self.reset_diagnostics()
+        self.render_changes = True
+
+    def rebuild_solver(self, properties=None):
+        # Builds the solver for the requested material, dt, integrator and solver on the
+        # factorizer thread. The plate keeps stepping with its current one until install_solver
+        # swaps the new one in between two steps; a newer request supersedes an unfinished one
+        if properties is None:
+            properties = load_properties(self.material, self.plate.points)
+        if self.pending is not None:
+            self.pending[1].cancel()
+        _, _, diffusivity, layout = properties
+        future = self.factorizer.submit(self.plate.build_solver, self.dt, diffusivity, self.integrator, self.solver, layout)
+        self.pending = (self.plate, future, self.material, properties)
+
+    def install_solver(self):
+        if self.pending is None or not self.pending[1].done():
+            return
+        plate, future, material, (p, c, _, _) = self.pending
+        self.pending = None
+        if plate is not self.plate or future.cancelled():
+            return
+        try:
+            built = future.result()
+        except InputError as e:
+            print("[WARN]", e, flush=True)
+            # Back to what the plate is running, so later requests do not inherit the rejected one
+            self.integrator = "auto" if plate.automatic else plate.integrator
+            self.solver = plate.solver
+            self.material = self.plate_material
+            return
+        new_material = material != self.plate_material
+        plate.install_solver(built)
+        plate.p = p
+        plate.c = c
+        self.plate_material = material
+        self.reset_stepper()
+        if new_material:
+            self.reset_diagnostics()
         self.render_changes = True
 
     def update_material(self, new_material):
+        check_layout(new_material, self.integrator, self.solver)
+        properties = load_properties(new_material, self.plate.points)
         self.material = new_material
-        try:
-            self.plate.gen_material_properties(new_material)
-        except InitializationError:
-            raise
-        except InputError:
-            raise
-        self.plate.gen_solver(self.dt)
+        self.rebuild_solver(properties)
+
+    def update_integrator(self, new_integrator):
+        if new_integrator not in INTEGRATORS:
+            raise ParameterError(f"unknown integrator {new_integrator}.")
+        check_layout(self.material, new_integrator, self.solver)
+        self.integrator = new_integrator
+        self.rebuild_solver()
+
+    def update_solver(self, new_solver):
+        if new_solver not in SOLVERS:
+            raise ParameterError(f"unknown solver {new_solver}.")
+        check_layout(self.material, self.integrator, new_solver)
+        self.solver = new_solver
+        self.rebuild_solver()
+
+    def update_tolerance(self, new_tolerance):
+        self.tolerance = new_tolerance
+        self.plate.tolerance = new_tolerance
+        # Whichever integrator is stepping on it, a CG solver takes the new tolerance in place
+        if isinstance(self.plate.solve, CGSolver):
+            self.plate.solve.tolerance = new_tolerance
+        # The stepper's solvers for its other levels were built with the old one
+        self.reset_stepper()
+
+    def update_boundary(self, path):
+        # Edges are moved per step on the current solver; "none" holds them where they are
+        if path == "none":
+            self.boundary_path = None
+            self.plate.set_boundary(None)
+        else:
+            self.plate.set_boundary(load_boundary(path, self.plate.points))
+            self.boundary_path = path
+        self.reset_stepper()
+        self.reset_diagnostics()
         self.render_changes = True
 
     def update_thickness(self, new_thickness):
         self.thickness = new_thickness
+        self.reset_diagnostics()
+
+    def update_diagnostics(self, every):
+        self.diagnostics_every = every
+        self.diagnostics.every = every
 
     def update_dt(self, new_dt):
         self.dt = new_dt
-        self.plate.gen_solver(new_dt)
+        self.rebuild_solver()
+
+    def update_schedule(self, steps_per_frame=None, target_fps=None, sim_rate=None):
+        if steps_per_frame is not None:
+            self.scheduler.steps_per_frame = steps_per_frame
+        if target_fps is not None:
+            self.scheduler.target_fps = target_fps
+        if sim_rate is not None:
+            self.scheduler.sim_rate = sim_rate
+        self.scheduler.reset()
+
+    def update_adaptive(self, tolerance):
+        if tolerance > 0:
+            self.stepper = AdaptiveStepper(self.plate, self.dt, tolerance)
+        else:
+            self.stepper = None
+            self.rebuild_solver()
         self.render_changes = True
 
+    def reset_stepper(self):
+        if self.stepper is not None:
+            self.stepper = AdaptiveStepper(self.plate, self.dt, self.stepper.tolerance)
+
+    def observers(self):
+        if self.recorder is None:
+            return [self.diagnostics]
+        return [self.diagnostics, self.recorder]
+
+    def start_recording(self, path, every=1, compress=False):
+        message = self.stop_recording()
+        # Frames are dropped rather than stalling the solver if the writer falls behind
+        self.recorder = Recorder(path, self.plate, self.params, every, compress=compress, block=False)
+        started = f"Recording every {every} steps to {path}."
+        return started if message is None else f"{message}\n{started}"
+
+    def stop_recording(self):
+        if self.recorder is None:
+            return None
+        recorder = self.recorder
+        self.recorder = None
+        try:
+            recorder.close()
+        except OSError as e:
+            return f"[WARN] Recording failed: {e}"
+        return f"Recorded {recorder.frames()} frames ({recorder.dropped} dropped)."
+
+    def reset_diagnostics(self):
+        # Energies and the balance are relative to the state at reset, so any change of the
+        # plate, its material or thickness starts a new time series
+        if self.diagnostics is None:
+            self.diagnostics = Diagnostics(self.plate, self.thickness, self.diagnostics_every)
+        else:
+            self.diagnostics.reset(self.plate, self.thickness)
+
     def start(self):
         self.running = True
+        self.scheduler.reset()
         self.render_changes = True
 
     def stop(self):
@@ -180,14 +361,87 @@ Total Thermal Energy: {thermal_energy}{energy_units}
         self.render_changes = True
 
     def restart(self):
+        message = self.stop_recording()
         self.plate.reset()
+        self.reset_stepper()
+        self.reset_diagnostics()
         self.running = False
         self.render_changes = True
-
-    def step(self):
-        self.plate.update()
+        return message
+
+    def close(self):
+        return self.stop_recording()
+
+    def current_dt(self):
+        if self.stepper is not None:
+            return self.stepper.dt
+        return self.plate.dt
+
+    def step(self, steps=1):
+        if self.profiler is not None:
+            profiled = min(steps, self.profile_steps)
+            self.profiler.enable()
+            self.timed_advance(profiled)
+            self.profiler.disable()
+            self.profile_steps -= profiled
+            steps -= profiled
+            if self.profile_steps == 0:
+                self.profiler.dump_stats(self.profile_path)
+                print(f"Profile written to {self.profile_path}.", flush=True)
+                self.profiler = None
+        self.timed_advance(steps)
         self.render_changes = True
 
+    def timed_advance(self, steps):
+        # Steps one at a time only while stats are on, so every step's latency is a sample
+        if not stats.enabled:
+            self.advance(steps)
+            return
+        for _ in range(steps):
+            with stats.timer("update"):
+                self.advance(1)
+
+    def advance(self, steps):
+        if self.stepper is not None:
+            observers = self.observers()
+            for _ in range(steps):
+                self.stepper.step()
+                for observer in observers:
+                    observer.stepped()
+        else:
+            self.plate.advance(steps, self.observers())
+
+
+class SolverClient:
+    # The REPL's handle on the SimState living in the solver process. Every method call is
+    # sent as a message, applied by the solver between two steps, and answered with its
+    # return value or the error it raised
+    def __init__(self, ctx, frames):
+        self.commands = ctx.Queue()
+        self.replies = ctx.Queue()
+        self.process = ctx.Process(target=solver_process, args=(self.commands, self.replies, frames), daemon=True)
+        self.process.start()
+
+    def call(self, name, *args):
+        self.commands.put((name, args))
+        while True:
+            try:
+                ok, result = self.replies.get(timeout=REPLY_TIMEOUT)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    raise InitializationError("the solver process exited.")
+                continue
+            if ok:
+                return result
+            raise result
+
+    def shutdown(self):
+        self.commands.put(None)
+        self.process.join(REPLY_TIMEOUT)
+
+    def __getattr__(self, name):
+        return lambda *args: self.call(name, *args)
+
 
 class MyParser(argparse.ArgumentParser):
     def error(self, message):
@@ -202,17 +456,31 @@ class MyParser(argparse.ArgumentParser):
         new_cmd = subs.add_parser("new", help="initialize a new plate")
         new_cmd.add_argument("-f", "--function", type=str, help="function with which to generate the initial heat distribution")
         new_cmd.add_argument("-p", "--points", type=int, help="number of points per side with which to approximate the plate")
-        new_cmd.add_argument("-m", "--material", type=str, help="material of the plate")
+        new_cmd.add_argument("-m", "--material", type=str, help="material of the plate, or up to four comma-separated ones for its quadrants")
         new_cmd.add_argument("-s", "--side", type=float, help="side length of the plate in meters")
         new_cmd.add_argument("-t", "--time", type=float, help="time step of the simulation in seconds")
         new_cmd.add_argument("-th", "--thickness", type=float, help="thickness of the plate in meters")
+        new_cmd.add_argument("-i", "--integrator", type=str, help="time integrator (euler, cn, adi, ftcs or auto)")
+        new_cmd.add_argument("-S", "--solver", type=str, help="linear solver backend (lu, dst or cg)")
+        new_cmd.add_argument("-tol", "--tolerance", type=float, help="relative residual tolerance of the cg solver")
+        new_cmd.add_argument("--seed", type=int, help="seed for the initial heat distribution of this plate")
+        new_cmd.add_argument("-P", "--precision", type=str, help="floating point precision of the plate (float64 or float32)")
         new_cmd.add_argument("-d", "--defaults", action="store_true", help="use default parameters")
 
         update_cmd = subs.add_parser("update", help="modify certain parameters")
-        update_cmd.add_argument("-m", "--material", type=str, help="modify the material of the plate")
+        update_cmd.add_argument("-m", "--material", type=str, help="modify the material of the plate, or its materials by quadrant")
         update_cmd.add_argument("-s", "--side", type=float, help="modify the side length")
         update_cmd.add_argument("-t", "--time", type=float, help="modify the time step")
         update_cmd.add_argument("-th", "--thickness", type=float, help="modify the thickness")
+        update_cmd.add_argument("-k", "--steps", type=int, help="number of steps to advance between redraws")
+        update_cmd.add_argument("-fps", "--fps", type=float, help="pick the steps per frame automatically to hold this frame rate, 0 to disable")
+        update_cmd.add_argument("-r", "--rate", type=float, help="simulated seconds to advance per wall clock second, 0 to disable")
+        update_cmd.add_argument("-dg", "--diagnostics", type=int, help="sample the diagnostics every this many steps")
+        update_cmd.add_argument("-a", "--adaptive", type=float, help="adaptive time stepping with the given error per step in kelvin, 0 to disable")
+        update_cmd.add_argument("-i", "--integrator", type=str, help="modify the time integrator")
+        update_cmd.add_argument("-S", "--solver", type=str, help="modify the linear solver backend")
+        update_cmd.add_argument("-tol", "--tolerance", type=float, help="modify the tolerance of the cg solver")
+        update_cmd.add_argument("-b", "--boundary", type=str, help="JSON file scheduling the edge temperatures, none to stop")
 
         materials_cmd = subs.add_parser("materials", help="print a list of usable materials")
         functions_cmd = subs.add_parser("functions", help="print a list of functions")
@@ -223,19 +491,23 @@ class MyParser(argparse.ArgumentParser):
         exit_cmd = subs.add_parser("exit", help="exit the simulation")
         clear_cmd = subs.add_parser("clear", help="clear the screen")
         info_cmd = subs.add_parser("info", help="print detailed information about the current simulation")
+        record_cmd = subs.add_parser("record", help="record the simulation to a file")
+        record_cmd.add_argument("path", type=str, nargs="?", help="file to record to")
+        record_cmd.add_argument("-k", "--every", type=int, default=1, help="record every this many steps")
+        record_cmd.add_argument("-z", "--compress", action="store_true", help="compressed chunked file instead of a memory-mapped one")
+        record_cmd.add_argument("-x", "--stop", action="store_true", help="stop recording")
+        steady_cmd = subs.add_parser("steady", help="solve for the equilibrium of the current plate")
+        steady_cmd.add_argument("-e", "--epsilon", type=float, default=EQUILIBRIUM_TOLERANCE, help="distance in kelvin from the equilibrium that counts as settled")
+        steady_cmd.add_argument("-a", "--apply", action="store_true", help="jump the plate to its equilibrium")
+        stats_cmd = subs.add_parser("stats", help="print latency percentiles of the hot paths")
+        stats_cmd.add_argument("-on", "--on", action="store_true", help="start collecting")
+        stats_cmd.add_argument("-off", "--off", action="store_true", help="stop collecting")
+        stats_cmd.add_argument("-r", "--reset", action="store_true", help="discard the samples collected so far")
+        stats_cmd.add_argument("-p", "--profile", type=int, help="profile this many steps with cProfile")
+        stats_cmd.add_argument("-o", "--output", type=str, default=PROFILE_PATH, help="file to write the profile to")
         help_cmd = subs.add_parser("help", help="print a help message")
 
 
-def gen_plate(points, side_length, function, new_min, new_max):
-    try:
-        fn = getattr(gen, f"{function}_map")
-    except AttributeError:
-            raise ParameterError(f"unknown function name {function}.")
-    initial_map = fn(points, new_min, new_max)
-    new_plate = Plate(initial_map, points, side_length)
-    return new_plate
-
-
 def input_loop(state):
     parser = MyParser(exit_on_error=False)
     parser.populate()
@@ -247,122 +519,145 @@ def input_loop(state):
         except Exception as e:
             print("[WARN]", e)
             continue
-        match args.cmd:
-            case "help":
-                print_help_message()
-
-            case "materials":
-                try:
-                    info = ut.generate_materials_list(MATERIALS_PATH)
-                except InitializationError as e:
-                    print("[FATAL]", e)
-                    os._exit(1)
-                print(info)
-
-            case "defaults":
-                try:
-                    info = ut.generate_defaults_info(DEFAULTS_PATH)
-                except InitializationError as e:
-                    print("[FATAL]", e)
-                    os._exit(1)
-                print(info)
-
-            case "functions":
-                try:
-                    info = ut.generate_functions_list(FUNCTIONS_PATH)
-                except InitializationError as e:
-                    print("[FATAL]", e)
-                    os._exit(1)
-                print(info)
-
-            case "info":
-                with lock:
-                    if not begin_sim.is_set():
-                        print("[WARN] Cannot print info before initializing a plate.")
-                        continue
-                    state.print_info()
-
-            case "start":
-                with lock:
-                    if not begin_sim.is_set():
-                        print("[WARN] Cannot start before initializing a plate.")
-                        continue
-                    state.start()
-
-            case "stop":
-                with lock:
-                    if not begin_sim.is_set():
-                        print("[WARN] Cannot stop before initializing a plate.")
-                        continue
-                    state.stop()
-
-            case "restart":
-                with lock:
-                    if not begin_sim.is_set():
-                        print("[WARN] Cannot restart before initializing a plate.")
-                        continue
-                    state.restart()
-
-            case "exit":
-                os._exit(1)
-
-            case "clear":
-                ut.clear()
-
-            case "new":
-                with lock:
-                    state.reset_flags()
-                    try:
-                        if not begin_sim.is_set():
-                            defaults = ut.get_default_params(DEFAULTS_PATH)
-                            state.add_default_attributes(defaults)
-                            state.params = defaults
-                        if args.defaults:
-                            defaults = ut.get_default_params(DEFAULTS_PATH)
-                            state.params = defaults
-                        else:
-                            for key, val in vars(args).items():
-                                if val and key in state.params:
-                                    if key == "points" and val != state.points:
-                                        state.regen_plot = True
-                                    state.params[key] = val
-                        state.update_plate()
-                        begin_sim.set()
-                    except InputError as e:
-                        print("[WARN]", e)
-                        continue
-                    except InitializationError as e:
-                        print("[FATAL]", e)
-                        os._exit(1)
-            case "update":
-                with lock:
-                    if not begin_sim.is_set():
-                        print("[WARN] Cannot update parameters before initializing a plate.")
-                        continue
-                    if args.time:
-                        state.update_dt(args.time)
-                    if args.material:
-                        try:
-                            state.update_material(args.material)
-                        except InputError as e:
-                            print("[WARN]", e)
-                            continue
-                        except InitializationError as e:
-                            print("[FATAL]", e)
-                            os._exit(1)
-                    if args.thickness:
-                        state.update_thickness(args.thickness)
+        try:
+            run_command(state, args)
+        except InputError as e:
+            print("[WARN]", e)
+        except InitializationError as e:
+            print("[FATAL]", e)
+            os._exit(1)
+        if end_sim.is_set():
+            return
+
+
+def run_command(state, args):
+    match args.cmd:
+        case "help":
+            print_help_message()
+
+        case "materials":
+            print(ut.generate_materials_list(MATERIALS_PATH))
+
+        case "defaults":
+            print(ut.generate_defaults_info(DEFAULTS_PATH))
+
+        case "functions":
+            print(ut.generate_functions_list(FUNCTIONS_PATH))
+
+        case "info":
+            if not begin_sim.is_set():
+                raise UninitializedError("Cannot print info before initializing a plate.")
+            print(state.info())
+
+        case "steady":
+            if not begin_sim.is_set():
+                raise UninitializedError("Cannot solve for the equilibrium before initializing a plate.")
+            if args.epsilon <= 0:
+                raise ParameterError("Epsilon must be positive.")
+            print(state.steady(args.epsilon, args.apply))
+
+        case "start":
+            if not begin_sim.is_set():
+                raise UninitializedError("Cannot start before initializing a plate.")
+            state.start()
+
+        case "stop":
+            if not begin_sim.is_set():
+                raise UninitializedError("Cannot stop before initializing a plate.")
+            state.stop()
+
+        case "restart":
+            if not begin_sim.is_set():
+                raise UninitializedError("Cannot restart before initializing a plate.")
+            print_message(state.restart())
+
+        case "record":
+            if not begin_sim.is_set():
+                raise UninitializedError("Cannot record before initializing a plate.")
+            if args.stop:
+                print_message(state.stop_recording())
+            elif args.path is None:
+                raise ParameterError("A file to record to is required.")
+            elif args.every < 1:
+                raise ParameterError("Frames must be recorded at least every step.")
+            else:
+                print_message(state.start_recording(args.path, args.every, args.compress))
+
+        case "stats":
+            if not begin_sim.is_set():
+                raise UninitializedError("Cannot collect stats before initializing a plate.")
+            if args.on or args.off:
+                # The renderer collects its own in this process
+                stats.enabled = args.on
+                state.enable_stats(args.on)
+            if args.reset:
+                stats.reset()
+                state.reset_stats()
+            if args.profile is not None:
+                if args.profile < 1:
+                    raise ParameterError("At least one step must be profiled.")
+                print(state.start_profile(args.profile, args.output))
+            if not (args.on or args.off or args.reset or args.profile):
+                report = "\n".join(line for line in (state.stats(), stats.report()) if line)
+                print(report or 'No stats collected; start collecting with "stats -on".')
+
+        case "exit":
+            if begin_sim.is_set():
+                print_message(state.close())
+            # The main thread shuts the solver process down, so its shared memory is released
+            end_sim.set()
+            begin_sim.set()
+
+        case "clear":
+            ut.clear()
+
+        case "new":
+            state.new_plate(vars(args), args.defaults, args.seed)
+            begin_sim.set()
+
+        case "update":
+            if not begin_sim.is_set():
+                raise UninitializedError("Cannot update parameters before initializing a plate.")
+            if args.time:
+                state.update_dt(args.time)
+            if args.material:
+                state.update_material(args.material)
+            if args.integrator:
+                state.update_integrator(args.integrator)
+            if args.solver:
+                state.update_solver(args.solver)
+            if args.tolerance:
+                state.update_tolerance(args.tolerance)
+            if args.thickness:
+                state.update_thickness(args.thickness)
+            if args.boundary:
+                state.update_boundary(args.boundary)
+            if args.adaptive is not None:
+                state.update_adaptive(args.adaptive)
+            if args.diagnostics is not None:
+                if args.diagnostics < 1:
+                    raise ParameterError("Diagnostics must be sampled at least every step.")
+                state.update_diagnostics(args.diagnostics)
+            if args.steps is not None and args.steps < 1:
+                raise ParameterError("Steps per frame must be at least 1.")
+            state.update_schedule(args.steps, args.fps, args.rate)
+
+
+def print_message(message):
+    if message is not None:
+        print(message)
 
 
 def generate_plot_info(state):
-    average_temp = state.plate.heat_map.mean().round(2)
-    dt = state.dt
-    material = state.material.capitalize()
+    average_temp = state.diagnostics.latest().mean.round(2)
+    dt = state.current_dt()
+    material = describe(state.plate_material)
     if state.running:
         status = "Running"
     else:
         status = "Paused"
-    return f"Δt: {dt}s\nMaterial: {material}\nAverage Temp: {average_temp}K\nStatus: {status}"
+    steps_per_second = round(state.steps_meter.rate, 1)
+    return f"Δt: {dt}s\nMaterial: {material}\nAverage Temp: {average_temp}K\nStatus: {status}\nSteps/s: {steps_per_second}"
 
 
 def print_help_message():
@@ -379,17 +674,31 @@ COMMANDS
         If no plate has been initialized, this will generate a new plate to be simulated. If a plate has already been initialized, this will stop the current simulation and generate a new initial distribution.
         new -d — Generates a plate with default parameters.
         new -f {function} {options} — Function with which to generate the initial heat distribution.
-        new -m {material} {options} — Material of the plate.
+        new -m {material} {options} — Material of the plate. Up to four comma-separated materials (e.g. copper,iron,gold,silver) are laid out over the quadrants of the plate, cycling through them, so two make left and right halves. Such plates use the euler or cn integrator with the lu solver, with every face conducting at the harmonic mean of the cells either side and every cell storing heat at its own ρc.
         new -s {side length} {options} — Physical size of the grid in meters.
         new -p {points} {options} — Number of points per side with which the plate is approximated.
         new -t {time step} {options} — Time step with which to simulate the plate in seconds.
         new -th {thickness} {options} — Thickness of the plate in meters.
+        new --seed {seed} {options} — Seed for the initial heat distribution, so the same plate can be generated again. Unlike the other options it only applies to this plate.
+        new -i {integrator} {options} — Time integrator: euler (Backward Euler), cn (Crank-Nicolson) or adi (Peaceman-Rachford alternating direction implicit). cn and adi are second order in time but less damped at very large time steps. ftcs (explicit) splits every step into as many stable sub-steps as it needs, in row tiles across all cores; auto picks ftcs or euler with the solver, whichever is estimated to be cheaper at the time step.
+        new -S {solver} {options} — Linear solver backend: lu (sparse LU factorization), dst (discrete sine transform) or cg (multigrid preconditioned conjugate gradients).
+        new -tol {tolerance} {options} — Relative residual tolerance of the cg solver.
+        new -P {precision} {options} — float64 (the default) or float32. float32 halves the memory and bandwidth of every array, from the heat map and factorization to the frames and recordings; "batch --drift" shows how far it ends up from float64. The energy balance is then only checked to float32 round-off, a few millionths of the plate's energy.
         If an option is not provided, its parameter will be copied from the previous plate (i.e. changes to parameters are persistent). If no plate has been initialized, the default parameters will be used. 
     • update {options}
-        If a plate has been initialized, this will update the specified parameters. This command can be run at any time so long as a plate has been initialized. 
+        If a plate has been initialized, this will update the specified parameters. This command can be run at any time so long as a plate has been initialized. Changes to -m, -t, -i and -S build the new solver in the background, so the plate keeps stepping with the old one until it is ready.
         update -m {material} {options} — Modifies the material of the plate.
         update -t {time step} {options} — Modifies the time step.
         update -th {thickness} {options} — Modifies the thickness of the plate.
+        update -k {steps} {options} — Advances the given number of steps between redraws.
+        update -fps {fps} {options} — Picks the number of steps between redraws automatically to hold the given frame rate. 0 disables it.
+        update -r {rate} {options} — Advances the given number of simulated seconds per wall clock second, limited by -fps if set. 0 disables it.
+        update -dg {steps} {options} — Samples the energy, temperatures and boundary heat flow every given number of steps for info and the plot. 1 (the default) also checks the energy balance exactly.
+        update -a {error} {options} — Adapts the time step to keep the estimated error per step below the given number of kelvin, stepping in powers of two of the time step. 0 disables it.
+        update -i {integrator} {options} — Modifies the time integrator.
+        update -S {solver} {options} — Modifies the linear solver backend.
+        update -tol {tolerance} {options} — Modifies the tolerance of the cg solver.
+        update -b {file} {options} — Moves the edge temperatures over time as scheduled in the given JSON file, without rebuilding the solver. It maps any of bottom, top, left and right to a temperature, to {"times": [...], "temps": [...], "period": seconds} for a piecewise-linear (optionally repeating) schedule, or to {"csv": file} for samples read from a CSV file of times and temperatures. Each sample may hold one temperature for the whole edge or one for every point along it. The schedule carries over to new plates; "none" stops it and leaves the edges where they are.
     • start
         Starts the simulation.
     • stop
@@ -400,54 +709,151 @@ COMMANDS
         Exits the program.
     • info
         Prints detailed information about the current simulation.
+    • record {file} {options}
+        Records the heat map to the given file as the simulation runs, along with the parameters it was started with. The writing happens in the background, so if the disk falls behind frames are dropped rather than slowing the simulation. Starting a new plate or restarting stops the recording.
+        record {file} -k {steps} {options} — Records every given number of steps.
+        record {file} -z {options} — Writes a compressed file in chunks instead of a memory-mapped one, for long runs.
+        record -x — Stops recording.
+    • steady {options}
+        Solves for the temperatures the plate settles to with a single solve, and predicts how many steps at the current time step it takes to get there.
+        steady -e {epsilon} {options} — Distance in kelvin from the equilibrium that counts as settled (0.01 by default).
+        steady -a {options} — Jumps the plate to its equilibrium, advancing the simulated time by the predicted time.
+    • stats {options}
+        Prints the 50th, 95th and 99th percentile latencies of a step, of building a solver, of drawing a frame and of waiting on the frame buffers, along with the size of the LU factors in use. Collecting them steps the plate one step at a time, so it is off until turned on.
+        stats -on — Starts collecting.
+        stats -off — Stops collecting, keeping what was collected.
+        stats -r — Discards everything collected so far.
+        stats -p {steps} -o {file} — Profiles the given number of steps with cProfile and writes the result to the given file (heatism.prof by default), which can be read with pstats, snakeviz or flameprof.
     • help
         Prints this message.
           """
     )
 
 
-def generate_plot(state):
-    plt.style.use("dark_background")
-    fig, axis = plt.subplots()
-    fig.subplots_adjust(right=0.75)
-    info = fig.text(
-        0.78, 0.5, generate_plot_info(state), va="center", ha="left", family="monospace"
-    )
-    pcm = axis.pcolormesh(
-        state.plate.heat_map, cmap=plt.cm.jet, vmin=state.min_temp, vmax=state.max_temp
-    )
-    bar = plt.colorbar(pcm, ax=axis)
-    state.fig = fig
-    state.axis = axis
-    state.info = info
-    state.pcm = pcm
-    state.bar = bar
+def apply_commands(state, commands, replies, wait):
+    # Messages from the REPL, applied between steps. While paused the first one is waited for.
+    # False once the REPL has asked the solver to stop
+    timeout = IDLE_INTERVAL if wait else 0
+    while True:
+        try:
+            command = commands.get(timeout=timeout) if timeout else commands.get_nowait()
+        except queue.Empty:
+            return True
+        if command is None:
+            return False
+        name, args = command
+        timeout = 0
+        try:
+            replies.put((True, getattr(state, name)(*args)))
+        except (InputError, InitializationError) as e:
+            replies.put((False, e))
+        except Exception as e:
+            # Anything else may not survive pickling, so it is passed back as a warning
+            replies.put((False, InputError(f"{type(e).__name__}: {e}")))
+
+
+def solver_process(commands, replies, frames):
+    # The solver's own process: owns the plate, steps it and publishes frames into shared
+    # memory, so neither the GIL nor a lock is shared with the REPL or the renderer. With a
+    # fixed number of steps per frame it waits for each frame to be picked up by the renderer
+    state = SimState(frames)
+    parent = multiprocessing.parent_process()
+    loop_start = perf_counter()
+    try:
+        while parent.is_alive():
+            if not apply_commands(state, commands, replies, not state.running):
+                break
+            if not state.params:
+                continue
+            state.install_solver()
+            steps = 0
+            step_time = 0
+            running = state.running
+            if running:
+                steps = state.scheduler.steps(state.current_dt())
+                step_start = perf_counter()
+                state.step(steps)
+                step_time = perf_counter() - step_start
+            state.steps_meter.tick(steps)
+            if state.render_changes:
+                state.publish()
+                state.render_changes = False
+            if running and state.scheduler.mode() == "fixed":
+                with stats.timer("frame_wait"):
+                    frames.taken.wait(IDLE_INTERVAL)
+            loop_end = perf_counter()
+            if running:
+                state.scheduler.record(steps, step_time, loop_end - loop_start)
+            loop_start = loop_end
+    finally:
+        state.close()
+        frames.release()
 
 
 begin_sim = threading.Event()
-lock = threading.Lock()
-
-sim = SimState()
-
-print('For a list of possible commands, use "help".')
-thread = threading.Thread(target=input_loop, args=(sim,), daemon=True)
-thread.start()
-
-begin_sim.wait()
-
-generate_plot(sim)
-
-while True:
-    with lock:
-        if sim.regen_plot:
-            plt.close()
-            generate_plot(sim)
-            sim.regen_plot = False
-        if sim.running:
-            sim.step()
-        if sim.render_changes:
-            sim.pcm.set_array(sim.plate.heat_map)
-            sim.info.set_text(generate_plot_info(sim))
-            sim.render_changes = False
-    plt.pause(0.01)
-plt.show()
+end_sim = threading.Event()
+RENDER_INTERVAL = 0.005
+IDLE_INTERVAL = 0.01
+REPLY_TIMEOUT = 1.0
+
+
+def main():
+    if sys.argv[1:2] == ["batch"]:
+        import batch
+
+        batch.main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["replay"]:
+        import recording
+
+        recording.main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["export"]:
+        import export
+
+        export.main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["sweep"]:
+        import sweep
+
+        sweep.main(sys.argv[2:])
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    frames = SharedFrames(ctx)
+    sim = SolverClient(ctx, frames)
+
+    print('For a list of possible commands, use "help".')
+    thread = threading.Thread(target=input_loop, args=(sim,), daemon=True)
+    thread.start()
+
+    begin_sim.wait()
+
+    renderer = None
+    generation = 0
+    while not end_sim.is_set():
+        if not sim.process.is_alive():
+            print("[FATAL] The solver process exited.")
+            os._exit(1)
+        frame, info, fresh = frames.take()
+        if frame is None:
+            sleep(IDLE_INTERVAL)
+            continue
+        if renderer is None or frames.generation != generation:
+            # A plate of a different size or temperature scale gets a new window
+            if renderer is not None:
+                renderer.close()
+            renderer = Renderer(frame, frames.points(), *frames.limits(), info)
+            generation = frames.generation
+            fresh = True
+        # Picked up by the solver at its next publish, so a resized window gets a matching frame
+        frames.set_stride(stride(frames.points(), renderer.pixels()))
+        if fresh:
+            with stats.timer("render"):
+                renderer.draw(frame, info)
+        renderer.wait(RENDER_INTERVAL)
+    sim.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import threading
+from collections import OrderedDict, deque
+from functools import lru_cache
+import numpy as np
+from backwards_euler import gen_coeff_matrix
+from exceptions import ParameterError
+from multigrid import Multigrid, apply_operator
+
+FACTOR_CACHE_BYTES = 2**30
+CG_TOLERANCE = 1e-8
+CG_HISTORY = 1000
+
+
+def factor_bytes(lu):
+    # Fill-in of the L and U factors: values, row indices and column pointers
+    total = 0
+    for factor in (lu.L, lu.U):
+        total += factor.data.nbytes + factor.indices.nbytes + factor.indptr.nbytes
+    return total
+
+
+def factorize(points, coeff, dtype=np.float64, layout=None):
+    # SuperLU factorizes and solves single precision matrices in single precision
+    import scipy.sparse.linalg as spl
+
+    if layout is not None:
+        coeff_matrix = layout.matrix(coeff, dtype)
+    else:
+        coeff_matrix = gen_coeff_matrix(points - 2, 1 + 4 * coeff, -coeff, dtype)
+    return spl.splu(coeff_matrix)
+
+
+class FactorCache:
+    # Safe to share between the stepping thread and a background factorization. The lock only
+    # covers the bookkeeping, never the factorization itself
+    def __init__(self, max_bytes=FACTOR_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, points, coeff, dtype=np.float64, layout=None):
+        # Plates of several materials are told apart by their layout's key
+        key = (points, coeff, np.dtype(dtype).str, None if layout is None else layout.key)
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key][0].solve
+            self.misses += 1
+        lu = factorize(points, coeff, dtype, layout)
+        nbytes = factor_bytes(lu)
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = (lu, nbytes)
+                self.size += nbytes
+                self.evict()
+        return lu.solve
+
+    def evict(self):
+        # The most recently used factorization is always kept, even if it alone exceeds the budget
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            _, (_, nbytes) = self.entries.popitem(last=False)
+            self.size -= nbytes
+
+    def solve_bytes(self, solve):
+        # Size of the factors behind a solve handed out by get, 0 if it is not cached
+        with self.lock:
+            for lu, nbytes in self.entries.values():
+                if lu.solve == solve:
+                    return nbytes
+        return 0
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+factor_cache = FactorCache()
+
+
+@lru_cache(maxsize=8)
+def laplacian_eigenvalues(n):
+    # Eigenvalues of the negative five-point Laplacian (scaled by dr^2) in the DST-I basis
+    mu = 4 * np.sin(np.arange(1, n + 1) * np.pi / (2 * (n + 1))) ** 2
+    return mu[:, None] + mu[None, :]
+
+
+class DSTSolver:
+    def __init__(self, points, coeff, dtype=np.float64):
+        import scipy.fft as fft
+
+        n = points - 2
+        self.dstn = fft.dstn
+        self.shape = (n, n)
+        self.dtype = dtype
+        self.eigenvalues = laplacian_eigenvalues(n)
+        self.rescale(coeff)
+
+    def rescale(self, coeff):
+        # scipy.fft keeps single precision input in single precision, so this has to match
+        self.inverse = (1 / (1 + coeff * self.eigenvalues)).astype(self.dtype)
+
+    def __call__(self, rhs):
+        # rhs is a vector of length n^2 or an (n^2, members) stack of them.
+        # With norm="ortho" the DST-I is its own inverse
+        grid = rhs.T.reshape(rhs.shape[1:] + self.shape)
+        spectrum = self.dstn(grid, type=1, norm="ortho", axes=(-2, -1), workers=-1)
+        spectrum *= self.inverse
+        solution = self.dstn(spectrum, type=1, norm="ortho", axes=(-2, -1), workers=-1, overwrite_x=True)
+        return solution.reshape(rhs.shape[::-1]).T
+
+
+class CGSolver:
+    def __init__(self, points, coeff, tolerance=CG_TOLERANCE):
+        import scipy.sparse.linalg as spl
+
+        n = points - 2
+        self.cg = spl.cg
+        self.shape = (n, n)
+        self.coeff = coeff
+        self.tolerance = tolerance
+        self.multigrid = Multigrid(n, coeff)
+        self.operator = spl.LinearOperator(
+            (n**2, n**2), dtype=float, matvec=lambda u: apply_operator(u.reshape(self.shape), self.coeff).ravel()
+        )
+        self.preconditioner = spl.LinearOperator(
+            (n**2, n**2), dtype=float, matvec=lambda r: self.multigrid.vcycle(r.reshape(self.shape)).ravel()
+        )
+        self.guess = None
+        self.iterations = 0
+        self.residual = 0.0
+        self.history = deque(maxlen=CG_HISTORY)
+
+    def __call__(self, rhs):
+        # Warm start from the previous solution, which is the current heat map interior
+        if self.guess is None:
+            self.guess = rhs.copy()
+        iterations = 0
+
+        def count(_):
+            nonlocal iterations
+            iterations += 1
+
+        solution, _ = self.cg(
+            self.operator,
+            rhs,
+            x0=self.guess,
+            rtol=self.tolerance,
+            atol=0.0,
+            M=self.preconditioner,
+            callback=count,
+        )
+        self.iterations = iterations
+        self.residual = np.linalg.norm(rhs - self.operator.matvec(solution)) / np.linalg.norm(rhs)
+        self.history.append((self.iterations, self.residual))
+        self.guess = solution
+        return solution
+
+
+SOLVERS = ("lu", "dst", "cg")
+
+
+def get_solver(name, points, coeff, tolerance=CG_TOLERANCE, dtype=np.float64, layout=None, cached=True):
+    # cg always iterates in double precision; its solution is rounded when written back.
+    # A plate of several materials (a layout) is only factorized, the DST and the multigrid
+    # both need one coefficient everywhere. cached=False factorizes without keeping the factors,
+    # for a one-off coefficient that would only crowd out reusable ones
+    if layout is not None and name in ("dst", "cg"):
+        raise ParameterError(f"plates of several materials need the lu solver, not {name}.")
+    match name:
+        case "lu":
+            if not cached:
+                return factorize(points, coeff, dtype, layout).solve
+            return factor_cache.get(points, coeff, dtype, layout)
+        case "dst":
+            return DSTSolver(points, coeff, dtype)
+        case "cg":
+            return CGSolver(points, coeff, tolerance)
+        case _:
+            raise ParameterError(f"unknown solver {name}.")
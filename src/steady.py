@@ -0,0 +1,95 @@
+import math
+import numpy as np
+from backwards_euler import gen_boundary_vector
+from explicit import substeps
+from exceptions import ParameterError
+
+EQUILIBRIUM_TOLERANCE = 0.01
+
+
+def line_eigenvalues(n):
+    # Eigenvalues of the negative second difference along one line of n interior points
+    return 4 * np.sin(np.arange(1, n + 1) * np.pi / (2 * (n + 1))) ** 2
+
+
+def steady_state(temps, layout=None):
+    # The map the plate settles to: its borders with the interior solving Laplace's equation,
+    # done as a single DST solve. Works for one map or a stack of them. A plate of several
+    # materials has no DST basis and is solved by its layout instead
+    if layout is not None:
+        return layout.steady_state(temps)
+    import scipy.fft as fft
+
+    n = temps.shape[-1] - 2
+    mu = line_eigenvalues(n)
+    rhs = gen_boundary_vector(temps, 1)
+    spectrum = fft.dstn(rhs, type=1, norm="ortho", axes=(-2, -1), workers=-1)
+    spectrum /= mu[:, None] + mu[None, :]
+    steady = temps.copy()
+    steady[..., 1:-1, 1:-1] = fft.dstn(spectrum, type=1, norm="ortho", axes=(-2, -1), workers=-1, overwrite_x=True)
+    return steady
+
+
+def amplification(integrator, n, coeff):
+    # Factor by which one step scales each DST mode of the distance to the steady state
+    mu = line_eigenvalues(n)
+    match integrator:
+        case "euler":
+            return 1 / (1 + coeff * (mu[:, None] + mu[None, :]))
+        case "cn":
+            half = coeff / 2 * (mu[:, None] + mu[None, :])
+            return (1 - half) / (1 + half)
+        case "adi":
+            line = (1 - coeff / 2 * mu) / (1 + coeff / 2 * mu)
+            return line[:, None] * line[None, :]
+        case "ftcs":
+            count = substeps(coeff)
+            return (1 - coeff / count * (mu[:, None] + mu[None, :])) ** count
+        case _:
+            raise ParameterError(f"unknown integrator {integrator}.")
+
+
+def time_constant(plate):
+    # e-folding time of the slowest mode of the continuous problem. For a plate of several
+    # materials this and steps_to_equilibrium are estimates at its slowest diffusivity
+    mu = line_eigenvalues(plate.points - 2)
+    return plate.dr**2 / (plate.diffusivity * 2 * mu[0])
+
+
+def steps_to_equilibrium(plate, epsilon=EQUILIBRIUM_TOLERANCE, steady=None, dt=None):
+    # Steps of dt (the plate's own by default) until no point is more than epsilon kelvin from the steady state.
+    # Every mode of the distance decays independently, so summing their worst case amplitudes
+    # bounds the maximum distance after k steps; the smallest such k is found by bisection
+    if steady is None:
+        steady = steady_state(plate.heat_map, plate.layout)
+    if dt is None:
+        dt = plate.dt
+    import scipy.fft as fft
+
+    n = plate.points - 2
+    distance = plate.heat_map[1:-1, 1:-1] - steady[1:-1, 1:-1]
+    amplitudes = np.abs(fft.dstn(distance, type=1, norm="ortho", workers=-1))
+    amplitudes *= 2 / (n + 1)
+    factors = np.abs(amplification(plate.integrator, n, plate.diffusivity * dt / plate.dr**2))
+    decaying = amplitudes > 0
+    amplitudes = amplitudes[decaying]
+    log_factors = np.log(factors[decaying])
+
+    def bound(k):
+        return (amplitudes * np.exp(k * log_factors)).sum()
+
+    if bound(0) <= epsilon:
+        return 0
+    if log_factors.max() >= 0:
+        return math.inf
+    high = 1
+    while bound(high) > epsilon:
+        high *= 2
+    low = high // 2
+    while high - low > 1:
+        middle = (low + high) // 2
+        if bound(middle) > epsilon:
+            low = middle
+        else:
+            high = middle
+    return high
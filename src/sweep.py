@@ -0,0 +1,163 @@
+import argparse
+import csv
+import itertools
+import math
+import os
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from exceptions import InitializationError
+import utils as ut
+from batch import build_plate
+from config import DEFAULTS_PATH, MATERIALS_PATH
+
+KEY_FIELDS = ["material", "function", "points", "dt", "duration"]
+# What the initial map depends on, so every material and dt starts from the same one
+SEED_FIELDS = ["function", "points"]
+RESULT_FIELDS = KEY_FIELDS + ["mean_temp", "energy", "equilibrium_time", "steps", "wall_time", "status"]
+EQUILIBRIUM_RATE = 0.01
+
+
+def run_key(run):
+    return tuple(str(run[field]) for field in KEY_FIELDS)
+
+
+def gen_runs(materials, functions, points, dts, durations):
+    return [
+        {"material": m, "function": f, "points": p, "dt": dt, "duration": T}
+        for m, f, p, dt, T in itertools.product(materials, functions, points, dts, durations)
+    ]
+
+
+def group_runs(runs, workers=None):
+    # Runs with the same grid and the same diffusivity * dt / dr^2 share one factorization,
+    # so they are kept together where that still leaves work for every worker: groups larger
+    # than an even share are split into chunks of at most that share, each of which is
+    # factorized once by whichever worker's cache it lands in
+    workers = workers or os.cpu_count() or 1
+    share = math.ceil(len(runs) / workers)
+    materials = ut.load_materials(MATERIALS_PATH)
+    groups = {}
+    for run in runs:
+        properties = materials.get(run["material"])
+        if properties is None:
+            # Layouts of several materials share a factorization by name; unknown materials are
+            # left to fail on their own in the worker
+            key = (run["points"], run["material"], run["dt"])
+        else:
+            key = (run["points"], properties[2] * run["dt"])
+        groups.setdefault(key, []).append(run)
+    chunks = [group[i : i + share] for group in groups.values() for i in range(0, len(group), share)]
+    # Largest chunks first so the pool does not end on one long straggler
+    return sorted(
+        chunks,
+        key=lambda group: sum(r["points"] ** 2 * r["duration"] / r["dt"] for r in group),
+        reverse=True,
+    )
+
+
+def simulate(params, duration, equilibrium_rate, seed):
+    plate = build_plate(params, seed)
+    dt = params["dt"]
+    steps = round(duration / dt)
+    previous = plate.heat_map.copy()
+    equilibrium_time = float("nan")
+    for _ in range(steps):
+        plate.update()
+        if math.isnan(equilibrium_time):
+            if np.abs(plate.heat_map - previous).max() / dt < equilibrium_rate:
+                equilibrium_time = plate.time
+            np.copyto(previous, plate.heat_map)
+    dv = plate.dr**2 * params["thickness"]
+    energy = dv * ut.heat_sum(plate.p, plate.c, plate.heat_map)
+    return plate.heat_map.mean(), energy, equilibrium_time, steps
+
+
+def run_group(group, base_params, equilibrium_rate):
+    rows = []
+    for run in group:
+        params = dict(base_params, **{k: v for k, v in run.items() if k != "duration"})
+        # Seeded from the initial condition alone, so runs of one function and grid are compared
+        # from the same map and a resumed sweep regenerates it
+        seed = zlib.crc32(repr(tuple(str(run[field]) for field in SEED_FIELDS)).encode())
+        start = time.perf_counter()
+        row = dict(run)
+        try:
+            mean_temp, energy, equilibrium_time, steps = simulate(params, run["duration"], equilibrium_rate, seed)
+            row.update(
+                mean_temp=mean_temp,
+                energy=energy,
+                equilibrium_time=equilibrium_time,
+                steps=steps,
+                status="ok",
+            )
+        except Exception as e:
+            # Recorded rather than raised so one bad run does not take down its group
+            row.update(status=f"error: {e}")
+        row["wall_time"] = time.perf_counter() - start
+        rows.append(row)
+    return rows
+
+
+def load_completed(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, newline="") as f:
+        return {run_key(row) for row in csv.DictReader(f) if row["status"] == "ok"}
+
+
+def sweep(runs, base_params, output, workers=None, equilibrium_rate=EQUILIBRIUM_RATE):
+    completed = load_completed(output)
+    pending = [run for run in runs if run_key(run) not in completed]
+    print(f"{len(runs)} runs, {len(runs) - len(pending)} already completed, {len(pending)} to go")
+    if not pending:
+        return
+    groups = group_runs(pending, workers)
+    new_file = not os.path.exists(output)
+    with open(output, "a", newline="") as f, ProcessPoolExecutor(workers) as pool:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS, extrasaction="ignore")
+        if new_file:
+            writer.writeheader()
+        futures = [pool.submit(run_group, group, base_params, equilibrium_rate) for group in groups]
+        done = 0
+        for future in as_completed(futures):
+            # Rows are flushed as soon as a group finishes so an interrupted sweep can resume
+            for row in future.result():
+                writer.writerow(row)
+                done += 1
+                print(f"[{done}/{len(pending)}] {row['material']} {row['function']} points={row['points']} dt={row['dt']}: {row['status']}")
+            f.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="simulation.py sweep", description="run a grid of plates over a process pool")
+    parser.add_argument("-m", "--materials", type=str, nargs="+", help="materials to sweep, all of materials.json by default")
+    parser.add_argument("-f", "--functions", type=str, nargs="+", help="initial condition functions")
+    parser.add_argument("-p", "--points", type=int, nargs="+", help="points per side")
+    parser.add_argument("-t", "--time", dest="dts", type=float, nargs="+", help="time steps in seconds")
+    parser.add_argument("-T", "--duration", dest="durations", type=float, nargs="+", required=True, help="simulated seconds per run")
+    parser.add_argument("-j", "--workers", type=int, help="worker processes, one per core by default")
+    parser.add_argument("-eq", "--equilibrium", type=float, default=EQUILIBRIUM_RATE, help="max change in kelvin per second that counts as equilibrium")
+    parser.add_argument("-o", "--output", type=str, default="sweep.csv", help="results table; completed runs in it are skipped")
+    args = parser.parse_args(argv)
+
+    try:
+        base_params = ut.get_default_params(DEFAULTS_PATH)
+        materials = args.materials or list(ut.load_materials(MATERIALS_PATH))
+    except InitializationError as e:
+        print("[FATAL]", e)
+        sys.exit(1)
+    runs = gen_runs(
+        materials,
+        args.functions or [base_params["function"]],
+        args.points or [base_params["points"]],
+        args.dts or [base_params["dt"]],
+        args.durations,
+    )
+    sweep(runs, base_params, args.output, args.workers, args.equilibrium)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,9 @@ from exceptions import (
     JsonFileError
 )
 
+config_cache = {}
+
+
 def clear():
     if platform.system() == "Windows":
         os.system("cls")
@@ -24,12 +27,16 @@ def convert_energy(energy):
         return (energy / (1000**3), "GJ")
 
 
+def heat_sum(p, c, temp_field):
+    # Σ p * c * T in double precision whatever the precision of the plate, with p and c either
+    # one material's or per cell
+    if getattr(p, "ndim", 0):
+        return (p * c * temp_field).sum(dtype=float)
+    return p * c * temp_field.sum(dtype=float)
+
+
 def total_energy(p, c, temp_field, dv):
-    total = 0
-    for row in temp_field:
-        for temp in row:
-            total += p * c * temp * dv
-    return convert_energy(total)
+    return convert_energy(dv * heat_sum(p, c, temp_field))
 
 
 def load_json(path):
@@ -48,20 +55,39 @@ def load_json(path):
     return file_contents
 
 
-def get_default_params(path):
+def load_config(path, parse=None):
+    # Configs are decoded once per process, optionally through parse, and shared by every
+    # caller until the file's modification time or size changes. The result must not be modified
     try:
-        defaults = load_json(path)
-    except InitializationError:
-        raise
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise JsonFileError(
+            f"could not find file at {path}."
+        )
+    key = (str(path), parse)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = config_cache.get(key)
+    if cached is None or cached[0] != version:
+        contents = load_json(path)
+        cached = (version, contents if parse is None else parse(contents))
+        config_cache[key] = cached
+    return cached[1]
+
+
+def check_defaults(defaults):
     try:
         material = defaults["material"]
         points = defaults["points"]
         side_length = defaults["side_length"]
         function = defaults["function"]
         dt = defaults["dt"]
+        integrator = defaults["integrator"]
+        solver = defaults["solver"]
+        tolerance = defaults["tolerance"]
         thickness = defaults["thickness"]
         new_min = defaults["min_temp"]
         new_max = defaults["max_temp"]
+        precision = defaults["precision"]
     except Exception as e:
         raise JsonFileError(
             f"could not decode default parameters: {e}."
@@ -69,13 +95,36 @@ def get_default_params(path):
     return defaults
 
 
+def get_default_params(path):
+    # A copy, since the parameters of a session are changed in place
+    try:
+        defaults = load_config(path, check_defaults)
+    except InitializationError:
+        raise
+    return dict(defaults)
+
+
+def parse_materials(material_dict):
+    # Density, specific heat and diffusivity of every material, computed once per load
+    try:
+        return {
+            material: (properties["p"], properties["c"], properties["k"] / (properties["p"] * properties["c"]))
+            for material, properties in material_dict.items()
+        }
+    except Exception as e:
+        raise JsonFileError(f"could not decode material properties: {e}.")
+
+
+def load_materials(path):
+    return load_config(path, parse_materials)
+
+
 def generate_materials_list(path):
     try:
-        material_dict = load_json(path)
+        materials = load_materials(path)
     except InitializationError:
         raise
-    material_list = material_dict.keys()
-    sorted_material_list = sorted(material_list, key=lambda x: material_dict[x]["k"]/(material_dict[x]["p"] * material_dict[x]["c"]), reverse=True)
+    sorted_material_list = sorted(materials, key=lambda x: materials[x][2], reverse=True)
     info = "\n"
     for material in sorted_material_list:
         info += material.capitalize() + "\n"
@@ -84,7 +133,7 @@ def generate_materials_list(path):
 
 def generate_defaults_info(path):
     try:
-        defaults = load_json(path)
+        defaults = load_config(path)
     except InitializationError:
         raise
     info = f"""
@@ -94,15 +143,19 @@ Sidefaultse Length: {defaults["side_length"]}m
 Thickness: {defaults["thickness"]}m
 Function: {defaults["function"].capitalize()}
 Time Step: {defaults["dt"]}s
+Integrator: {defaults["integrator"].upper()}
+Solver: {defaults["solver"].upper()}
+CG Tolerance: {defaults["tolerance"]}
 Min Temp: {defaults["min_temp"]}K
 Max Temp: {defaults["max_temp"]}K
+Precision: {defaults["precision"]}
     """
     return info
 
 
 def generate_functions_list(path):
     try:
-        functions_dict = load_json(path)
+        functions_dict = load_config(path)
     except InitializationError:
         raise
     info = "\n"